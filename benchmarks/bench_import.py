@@ -0,0 +1,84 @@
+"""Import-time benchmark and guard for `zreprt` startup.
+
+Measures (in fresh interpreters) how long it takes to import the package
+and the CLI entry point, and checks that heavy modules are not imported
+on the paths which do not need them. Prints results as JSON;
+exits non-zero if a guard fails or a median exceeds the `--max-ms` budget.
+
+    python benchmarks/bench_import.py [--repeat N] [--max-ms MS]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+CASES = {
+    # case: (code to time, modules not to be imported by it)
+    'import zreprt': (
+        'import zreprt',
+        ['attrs', 'cattrs', 'dateutil', 'sarif_om', 'sqlite3'],
+    ),
+    'zap-like model': (
+        'from zreprt import ZapReport',
+        ['dateutil', 'sarif_om', 'sqlite3'],
+    ),
+    'cli entry point': (
+        'import zreprt.__main__',
+        ['dateutil', 'sarif_om', 'sqlite3', 'concurrent.futures'],
+    ),
+    'sarif model': (
+        'from zreprt import SarifLog',
+        [],
+    ),
+}
+
+_PROBE = '''
+import sys, time
+t0 = time.perf_counter()
+exec({code!r})
+t1 = time.perf_counter()
+print((t1 - t0) * 1000)
+print(*sorted(m for m in {banned!r} if m in sys.modules))
+'''
+
+
+def run_case(code, banned, repeat):
+    timings, leaked = list(), set()
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(code=code, banned=banned)],
+            capture_output=True, text=True, check=True,
+        ).stdout.splitlines()
+        timings.append(float(out[0]))
+        leaked.update(out[1].split() if len(out) > 1 else [])
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'min_ms': round(min(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'leaked_modules': sorted(leaked),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=None, help='Budget for the median of each case.')
+    args = parser.parse_args()
+
+    results = {case: run_case(code, banned, args.repeat) for case, (code, banned) in CASES.items()}
+    print(json.dumps({'python': sys.version.split()[0], 'results': results}, indent=4))
+
+    failed = [
+        case for case, r in results.items()
+        if r['leaked_modules'] or (args.max_ms is not None and r['median_ms'] > args.max_ms)
+    ]
+    if failed:
+        print(f'FAILED: {failed}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
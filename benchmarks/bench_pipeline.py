@@ -0,0 +1,105 @@
+"""Time and memory benchmark of the parse/merge/convert pipeline on synthetic reports.
+
+For each corpus size (total instances over the reports generated by `zapgen`),
+every stage is timed (wall and CPU time), then re-run under `tracemalloc`
+for its peak of memory allocated. Prints results as JSON, to be compared
+between versions.
+
+    python benchmarks/bench_pipeline.py [--sizes 1000,100000,1000000] [--reports N]
+        [--alerts N] [--body-size BYTES] [--dup-ratio R] [--seed N] [--no-memory] [-o OUT]
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from attrs import evolve
+
+import zreprt
+from zreprt import ZapReport
+from zreprt.zrmerge import merge, preprocess
+from zreprt.zr2sarif import transmodel
+
+from zapgen import PLUGINS, Corpus
+
+
+def measure(fn, memory=True):
+    gc.collect()
+    w0, c0 = time.perf_counter(), time.process_time()
+    result = fn()
+    w1, c1 = time.perf_counter(), time.process_time()
+    stats = {'wall_s': round(w1 - w0, 4), 'cpu_s': round(c1 - c0, 4)}
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        stats['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 2)
+        tracemalloc.stop()
+    return result, stats
+
+
+def _fresh(zr):
+    """Copy of the report for `preprocess` to mutate, sharing alerts."""
+    return evolve(zr, site=[evolve(s, alerts=list(s.alerts)) for s in zr.site])
+
+
+def run_size(n, args, tmp_dir):
+    corpus = Corpus(n, args.sites, args.alerts, args.body_size, args.dup_ratio, args.seed)
+    paths = corpus.write(Path(tmp_dir) / str(n), args.reports)
+    res = {'input_mb': round(sum(p.stat().st_size for p in paths) / (1 << 20), 2), 'stages': dict()}
+
+    def stage(name, fn):
+        result, res['stages'][name] = measure(fn, not args.no_memory)
+        print(f'{n}: {name} {res["stages"][name]}', file=sys.stderr)
+        return result
+
+    zrs = stage('from_json_file', lambda: [ZapReport.from_json_file(p) for p in paths])
+    zrs = stage('preprocess', lambda zrs=zrs: [preprocess(_fresh(zr)) for zr in zrs])
+    stage('merge', lambda zrs=zrs: merge(zrs))
+    zr = stage('merge_trim', lambda zrs=zrs: merge(zrs, trim=True))  # NB: Trims instances of `zrs` in place
+    del zrs
+    res['instances_merged'] = sum(len(a.instances) for a in zr.site[0].alerts)
+    sarif = stage('transmodel', lambda: transmodel(zr))
+    stage('json', zr.json)
+    stage('json_orig', zr.json_orig)
+    stage('sarif_json', sarif.json)
+    for p in paths:
+        p.unlink()
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='Comma-separated total instance counts.')
+    parser.add_argument('--reports', type=int, default=2, help='Number of reports to merge.')
+    parser.add_argument('--sites', type=int, default=1)
+    parser.add_argument('--alerts', type=int, default=len(PLUGINS) * 2)
+    parser.add_argument('--body-size', type=int, default=1024)
+    parser.add_argument('--dup-ratio', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='Skip re-runs measuring peak memory.')
+    parser.add_argument('-o', '--out-file', default=None, help='Write JSON results here instead of STDOUT.')
+    args = parser.parse_args()
+
+    params = {k: v for k, v in vars(args).items() if k != 'out_file'}
+    with tempfile.TemporaryDirectory(prefix='zreprt-bench-') as tmp_dir:
+        results = {n: run_size(int(n), args, tmp_dir) for n in args.sizes.split(',')}
+    out = json.dumps({
+        'python': sys.version.split()[0],
+        'zreprt': zreprt.__version__,
+        'params': params,
+        'results': results,
+    }, indent=4)
+    if args.out_file:
+        Path(args.out_file).write_text(out + '\n')
+    else:
+        print(out)
+
+
+if __name__ == '__main__':
+    main()
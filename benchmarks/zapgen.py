@@ -0,0 +1,149 @@
+"""Deterministic generator of synthetic ZAP reports (`traditional-json-plus`), for benchmarks.
+
+A corpus of reports is generated at once, so that duplicate instances
+(the same finding again, as re-scans give) may repeat ones of earlier reports.
+Instances are produced lazily and written one by one, so corpora
+of millions of instances do not have to fit in memory.
+
+    python benchmarks/zapgen.py OUT_DIR [--reports N] [--instances N] [--sites N] [--alerts N]
+                                        [--body-size BYTES] [--dup-ratio R] [--seed N]
+"""
+
+import argparse
+import random
+from pathlib import Path
+
+from zreprt import zrjson
+
+
+PLUGINS = [
+    # (pluginid, alert, riskcode, cweid, wascid)
+    (10020, 'Missing Anti-clickjacking Header', 2, 1021, 15),
+    (10021, 'X-Content-Type-Options Header Missing', 1, 693, 15),
+    (10038, 'Content Security Policy (CSP) Header Not Set', 2, 693, 15),
+    (10109, 'Modern Web Application', 0, -1, -1),
+    (10202, 'Absence of Anti-CSRF Tokens', 2, 352, 9),
+    (40012, 'Cross Site Scripting (Reflected)', 3, 79, 8),
+    (40018, 'SQL Injection', 3, 89, 19),
+    (90022, 'Application Error Disclosure', 1, 200, 13),
+]
+RISKS = ['Informational', 'Low', 'Medium', 'High']
+
+
+class Corpus:
+    """Generator of reports sharing the pools of instances their duplicates come from."""
+
+    def __init__(self, instances=1000, sites=1, alerts=len(PLUGINS), body_size=1024, dup_ratio=0.2, seed=0):
+        self.instances, self.sites, self.alerts = instances, sites, alerts
+        self.body_size, self.dup_ratio = body_size, dup_ratio
+        self.rng = random.Random(seed)
+        self.filler = ''.join(self.rng.choices('abcdefghijklmnopqrstuvwxyz <>/="\n', k=max(body_size, 1) * 2))
+        self.pools = dict()  # (site_no, alert_no) -> keys of unique instances issued so far
+        self.next_key = 0
+
+    def _instance(self, host, key):
+        rng = random.Random(key)  # Same key, same instance
+        uri = f'https://{host}/app/{key % 97}/item?id={key}'
+        method = rng.choice(('GET', 'GET', 'POST'))
+        body = self.filler[rng.randrange(self.body_size + 1):][:self.body_size]
+        return {
+            'uri': uri,
+            'method': method,
+            'param': rng.choice(('', 'id', 'q', 'X-Frame-Options')),
+            'attack': rng.choice(('', '', "' OR '1'='1", '<script>alert(1)</script>')),
+            'evidence': rng.choice(('', 'HTTP/1.1 500', '<form action="/login">')),
+            'otherinfo': '',
+            'request-header': f'{method} {uri} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: zapgen\r\n\r\n',
+            'request-body': f'id={key}' if method == 'POST' else '',
+            'response-header': (
+                'HTTP/1.1 200 OK\r\nContent-Type: text/html;charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n'
+            ),
+            'response-body': body,
+        }
+
+    def _instances(self, site_no, alert_no, host, n):
+        pool = self.pools.setdefault((site_no, alert_no), list())
+        for _ in range(n):
+            if pool and self.rng.random() < self.dup_ratio:
+                key = self.rng.choice(pool)
+            else:
+                key, self.next_key = self.next_key, self.next_key + 1
+                pool.append(key)
+            yield self._instance(host, key)
+
+    def report(self, n_instances):
+        """Report of about `n_instances` instances, spread over sites and alerts, produced lazily."""
+        n_alerts = self.sites * self.alerts
+        counts = [n_instances // n_alerts + (i < n_instances % n_alerts) for i in range(n_alerts)]
+        sites = list()
+        for site_no in range(self.sites):
+            host = f's{site_no}.example.com'
+            alerts = list()
+            for alert_no in range(self.alerts):
+                pid, name, risk, cweid, wascid = PLUGINS[alert_no % len(PLUGINS)]
+                n = counts[site_no * self.alerts + alert_no]
+                alerts.append({
+                    'pluginid': str(pid),
+                    'alertRef': f'{pid}-{alert_no // len(PLUGINS) + 1}',
+                    'alert': name if alert_no < len(PLUGINS) else f'{name} #{alert_no // len(PLUGINS)}',
+                    'name': name,
+                    'riskcode': str(risk),
+                    'confidence': '2',
+                    'riskdesc': f'{RISKS[risk]} (Medium)',
+                    'desc': f'<p>{name}.</p><p>Synthetic alert description.</p>',
+                    'instances': self._instances(site_no, alert_no, host, n),
+                    'count': str(n),
+                    'solution': '<p>Fix it.</p>',
+                    'otherinfo': '',
+                    'reference': '<p>https://www.zaproxy.org/docs/alerts/</p>',
+                    'cweid': str(cweid),
+                    'wascid': str(wascid),
+                    'sourceid': '3',
+                    'tags': [{'tag': f'CWE-{cweid}', 'link': f'https://cwe.mitre.org/data/definitions/{cweid}.html'}],
+                })
+            sites.append({
+                '@name': f'https://{host}',
+                '@host': host,
+                '@port': '443',
+                '@ssl': 'true',
+                'alerts': alerts,
+            })
+        return {
+            '@programName': 'ZAP',
+            '@version': '2.14.0',
+            '@generated': 'Tue, 13 Feb 2024 10:00:00',
+            'site': sites,
+        }
+
+    def write(self, out_dir, reports=1):
+        """Write `reports` files, `instances` spread over them, to `out_dir`; return their paths."""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        paths = list()
+        for i in range(reports):
+            paths.append(out_dir / f'zap-{i}.json')
+            with open(paths[-1], 'w', encoding='utf-8') as fo:
+                zrjson.dump(self.report(self.instances // reports + (i < self.instances % reports)), fo, indent=2)
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('out_dir')
+    parser.add_argument('--reports', type=int, default=1)
+    parser.add_argument('--instances', type=int, default=1000, help='In total, over all the reports.')
+    parser.add_argument('--sites', type=int, default=1, help='Per report.')
+    parser.add_argument('--alerts', type=int, default=len(PLUGINS), help='Per site.')
+    parser.add_argument('--body-size', type=int, default=1024)
+    parser.add_argument('--dup-ratio', type=float, default=0.2, help='Share of instances repeating earlier ones.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = Corpus(args.instances, args.sites, args.alerts, args.body_size, args.dup_ratio, args.seed)
+    for p in corpus.write(args.out_dir, args.reports):
+        print(p)
+
+
+if __name__ == '__main__':
+    main()
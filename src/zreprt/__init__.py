@@ -1,10 +1,31 @@
 """OWASP® Zed Attack Proxy (ZAP) reporting utilities."""
 
 __all__ = [
-    'ZapReport', 'ZapSite', 'ZapAlertInfo', 'ZapAlertInstance',
-    'SarifLog',
+    'ZapReport', 'ZapSite', 'ZapAlertInfo', 'ZapAlertInstance', 'ZapReportReader',
+    'BodyStore', 'Filter', 'FindingsStore', 'ParseCache', 'SarifLog',
 ]
 __version__ = '0.4'
 
-from .sarif_om import SarifLog
-from .zreprt import ZapReport, ZapSite, ZapAlertInfo, ZapAlertInstance
+# Submodules are imported on first access to their names, to keep startup fast:
+# e.g. the SARIF object model is only built when SARIF is dealt with.
+_LAZY_NAMES = {
+    'SarifLog': '.sarif_om',
+    'ParseCache': '.zrcache',
+    'FindingsStore': '.zrstore',
+    'Filter': '.zrfilter',
+    **dict.fromkeys(
+        ('ZapReport', 'ZapSite', 'ZapAlertInfo', 'ZapAlertInstance', 'ZapReportReader', 'BodyStore'),
+        '.zreprt',
+    ),
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_NAMES:
+        from importlib import import_module
+        return getattr(import_module(_LAZY_NAMES[name], __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,75 +1,193 @@
 """`__main__.py` is an entry point for `python -m ...`."""
 
 import argparse
+import json
 import sys
-from attrs import evolve
-from io import TextIOWrapper
-from pathlib import Path
-from itertools import chain, groupby
 
-from . import ZapReport
-from .zr2sarif import transmodel
+from . import BodyStore
+from .zrbatch import MANIFEST_NAME, output_path
+from .zreprt import _BODY_FIELDS, _projections
+from .zrfilter import Filter
+from .zrio import open_output
+from .zrmerge import DEFAULT_ALERTS_EXCLUDED, _ingest, ingest, merge, merge_external
+from .zrmerge import preprocess  # noqa: F401  # Re-exported, as defined here before
+from .zrstats import stage
 
 
-DEFAULT_ALERTS_EXCLUDED = [
-    10109,  # Modern Web Application
-]
+# CLI options affecting output contents, as recorded into the batch manifest
+_OUTPUT_OPTIONS = (
+    'x', 'keep_data_full', 'no_bodies', 'drop_fields', 'max_body_size',
+    'zap_original_output', 'sarif_output', 'sarif_tables', 'sarif_input', 'filter',
+)
 
 
-def preprocess(zr, exclude_alerts=DEFAULT_ALERTS_EXCLUDED):
-    while len(zr.site) > 1:
-        _ = zr.site.pop(0)
+def _open_output(args):
+    output_file = args.out_file
+    if output_file is None:
+        if args.in_file[0].name == '<stdin>':
+            output_file = sys.stdout
+        else:
+            output_file = output_path(args.in_file[0].name)
+    elif output_file == '-':
+        output_file = sys.stdout
+    return open_output(output_file)
 
-    # Exclude some alerts
-    zr.site[0].alerts = list(filter(
-        lambda a: int(a.pluginid) not in exclude_alerts,
-        zr.site[0].alerts
-    ))
 
-    return zr
+def _run(args):
+    if args.sarif_input:
+        from .zrsarif import merge_sarif
+        with _open_output(args) as fo, stage('merge'):
+            merge_sarif(args.in_file, fo)
+        return
 
+    drop_fields = [*(_BODY_FIELDS if args.no_bodies else ()), *args.drop_fields]
+    flt = Filter.parse(args.filter) if args.filter else None
 
-def merge(zrs, trim=False):
-    zr_merged = evolve(
-        zrs[0],
-        **({'program_name': '(combo)', 'version': ''} if len(zrs) > 1 else {}),
-        site=[evolve(
-            zrs[0].site[0],
-            alerts=list(),
-        ),]
-    )
+    cache = None
+    if args.cache_dir is not None:
+        from .zrcache import ParseCache
+        cache = ParseCache(args.cache_dir, max_size=args.cache_size << 20)
 
-    kf = lambda a: (-int(a.riskcode), a.pluginid, a.alert, a.name, a.otherinfo)  # noqa: E731
-    for _gk, agrp in groupby(sorted((a for zr in zrs for a in zr.site[0].alerts), key=kf), key=kf):
-        agrp = list(agrp)
-        ais = sorted(
-            set(chain.from_iterable(a.instances for a in agrp)),
-            # Keep alert instances with non-empty request/response in the end, to be consistent with further clearing
-            key=lambda ai: (
-                bool(ai.request_header or ai.request_body or ai.response_header or ai.response_body),
-                ai,
+    if args.store is not None:
+        from .zrstore import FindingsStore, source_key
+        options = {
+            'exclude_alerts': sorted(args.x or DEFAULT_ALERTS_EXCLUDED),
+            'drop_fields': sorted(set(drop_fields)),
+            'max_body_size': args.max_body_size,
+            'filter': flt.terms() if flt is not None else [],
+        }
+        try:
+            store = FindingsStore(args.store, options)
+        except ValueError as e:
+            print(f'{__package__}: error: {e}', file=sys.stderr)
+            return 2
+        with store:
+            with stage('ingest'):
+                for f in args.in_file:
+                    source = None if f is sys.stdin else source_key(f.name)
+                    if source is not None and store.has(source):
+                        f.close()
+                        continue
+                    store.add(_ingest(
+                        f,
+                        exclude_alerts=args.x or DEFAULT_ALERTS_EXCLUDED,
+                        lazy=args.lazy_bodies,
+                        cache=cache,
+                        drop_fields=drop_fields,
+                        max_body_size=args.max_body_size,
+                        flt=flt,
+                    ), source)
+            with stage('merge'):  # NB: Mostly done lazily, while writing output
+                zr_merged = store.report(trim=not args.keep_data_full)
+            return _output(args, zr_merged)  # Reading alerts from the store
+    elif args.mem_budget is None:
+        bodies = BodyStore()
+        with stage('ingest'):
+            zrs = ingest(
+                args.in_file,
+                exclude_alerts=args.x or DEFAULT_ALERTS_EXCLUDED,
+                jobs=args.jobs,
+                bodies=bodies,
+                lazy=args.lazy_bodies,
+                cache=cache,
+                drop_fields=drop_fields,
+                max_body_size=args.max_body_size,
+                flt=flt,
+            )
+        with stage('merge'):
+            zr_merged = merge(zrs, trim=not args.keep_data_full, bodies=bodies)
+            del zrs, bodies  # Release duplicate instances and trimmed bodies
+    else:
+        with stage('merge'):  # NB: Includes ingest
+            zr_merged = merge_external(
+                args.in_file,
+                exclude_alerts=args.x or DEFAULT_ALERTS_EXCLUDED,
+                trim=not args.keep_data_full,
+                mem_budget=args.mem_budget << 20,
+                drop_fields=drop_fields,
+                max_body_size=args.max_body_size,
+                flt=flt,
             )
-        )
-        if trim:
-            # Clear the request/response for all but the last one
-            for i in range(len(ais) - 1):
-                ais[i].request_header = ''
-                ais[i].request_body = ''
-                ais[i].response_header = ''
-                ais[i].response_body = ''
-        new_alert = evolve(agrp[0], instances=ais, count=len(ais))
-        zr_merged.site[0].alerts.append(new_alert)
 
-    return zr_merged
+    return _output(args, zr_merged)
+
+
+def _output(args, zr_merged):
+    with _open_output(args) as fo, stage('output'):
+        if args.sarif_output:
+            from .zr2sarif import transmodel_dump  # SARIF object model is heavy to import
+            transmodel_dump(zr_merged, fo, max_body_size=args.max_body_size, tables=args.sarif_tables)
+        else:
+            (zr_merged.dump_json_orig if args.zap_original_output else zr_merged.dump_json)(fo)
+
+    if args.sqlite is not None:
+        from .zrsqlite import export_sqlite
+        with stage('sqlite'):
+            export_sqlite(zr_merged, args.sqlite)
+
+
+def _convert_group(options, in_files, out_file):
+    _run(argparse.Namespace(**{**options, 'in_file': in_files, 'out_file': out_file}))
+
+
+def batch(args):
+    """Convert groups of report files under `args.batch` directory (see `zrbatch`)
+    with up to `args.jobs` worker processes, skipping groups converted before
+    from the same inputs with the same options. Return the number of groups failed.
+    """
+    from .zrbatch import Manifest, report_groups
+    manifest = Manifest(args.batch)
+    options = {k: getattr(args, k) for k in _OUTPUT_OPTIONS}
+    groups, todo = dict(), list()
+    with stage('hash'):
+        for _, paths in report_groups(args.batch):
+            out_path = output_path(paths[0])
+            groups[key := manifest.key(out_path)] = entry = manifest.entry(paths, options)
+            if not manifest.is_current(out_path, entry):
+                todo.append((key, [str(p) for p in paths], str(out_path)))
+
+    unchanged, failed = len(groups) - len(todo), 0
+    group_options = {**vars(args), 'in_file': None, 'jobs': 1}  # NB: Picklable, without STDIN
+    with stage('convert'):
+        if args.jobs < 2 or len(todo) < 2:
+            outcomes = list()
+            for key, in_files, out_file in todo:
+                try:
+                    outcomes.append((key, _convert_group(group_options, in_files, out_file)))
+                except Exception as e:
+                    outcomes.append((key, e))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(args.jobs) as ex:
+                futures = [
+                    (key, ex.submit(_convert_group, group_options, in_files, out_file))
+                    for key, in_files, out_file in todo
+                ]
+                outcomes = [(key, fut.exception()) for key, fut in futures]
+        for key, e in outcomes:
+            if e is not None:
+                print(f'{key}: {type(e).__name__}: {e}', file=sys.stderr)
+                del groups[key]  # To be converted again next time
+                failed += 1
+
+    manifest.groups = groups  # NB: Groups gone are forgotten
+    manifest.save()
+    print(f'{len(todo) - failed} converted, {unchanged} unchanged, {failed} failed', file=sys.stderr)
+    return failed
 
 
 def main():
     """This callable is for more CLI-friendliness;
     ref: `project.scripts` at `pyproject.toml`."""
 
+    if sys.argv[1:2] == ['serve']:
+        from .zrserve import main as serve_main
+        return serve_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(
         prog=sys.modules[__name__].__package__,
         usage='{ %(prog)s | python -m %(prog)s } [options]',
+        epilog='Run `%(prog)s serve -h` for the resident conversion service options.',
     )
     parser.add_argument(
         'in_file',
@@ -77,29 +195,116 @@ def main():
         type=argparse.FileType('r'),
         default=[sys.stdin,],
         help='Input file to parse as ZAP(-like) report, defaults to `-` (STDIN data).'
+             ' Compressed ones (gzip, bzip2, xz) are decompressed on the fly.'
+    )
+    parser.add_argument(
+        '--batch',
+        default=None,
+        metavar='DIR',
+        help='Instead of input files, convert each directory of report files (`*.json[.gz|.bz2|.xz]`)'
+             ' under DIR, merging them into "<filename>-m.<ext>" after the first one;'
+             ' with -j N, N directories at once. Content hashes of inputs are kept'
+             f' in DIR/{MANIFEST_NAME}, so that unchanged directories are skipped next time.'
     )
     parser.add_argument(
         '-o', '--out_file',
-        type=argparse.FileType('w'),
         default=None,
-        help='Output file to write ZAP[-like] report to.'
+        help='Output file to write ZAP[-like] report to, `-` for STDOUT;'
+             ' compressed when named `*.gz`, `*.bz2`, `*.xz`.'
              ' Defaults to STDOUT when reading from STDIN,'
              ' and to "<filename>-m.<ext>" when "<filename>.<ext>" specified as input.'
     )
     parser.add_argument(
         '-x',
         action='append',
+        type=int,
         default=list(),
         help="Exclude alert(s) by their ZAP's `pluginid`, can be specified multiple times."
              ' Ref: <https://www.zaproxy.org/docs/alerts/>.'
              f' Use of this option overrides the default {DEFAULT_ALERTS_EXCLUDED}.'
     )
+    parser.add_argument(
+        '-f', '--filter',
+        action='append',
+        default=list(),
+        metavar='TERM',
+        help='Keep only findings matching this term, applied while parsing; can be specified multiple times.'
+             ' Terms: plugin=ID[|ID...], plugin!=ID[|ID...], risk>=N|low|medium|high,'
+             ' confidence>=N|low|medium|high|confirmed, uri^=PREFIX, uri~=REGEX, host=HOST[|HOST...].'
+             ' Terms of different keys must all hold; repeated ones of the same key add alternatives'
+             ' (any holds), except plugin!= ones add exclusions, and the highest risk>=/confidence>= applies.'
+    )
     parser.add_argument(
         '-k', '--keep-data-full', '--keep_data_full',
         action='store_true',
         help='Skip the default clearing request-response for alert instances,'
              ' except the last one within each alert.'
     )
+    parser_ingest_args = parser.add_mutually_exclusive_group(required=False)
+    parser_ingest_args.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='Parse and preprocess input files with N worker processes. Defaults to 1 (no workers).'
+    )
+    parser_ingest_args.add_argument(
+        '--mem-budget', '--mem_budget',
+        type=int,
+        default=None,
+        metavar='MB',
+        help='Merge out of core: read input files alert by alert,'
+             ' spilling sorted runs of alert instances to temporary files once about MB megabytes are buffered.'
+    )
+    parser.add_argument(
+        '--lazy-bodies', '--lazy_bodies',
+        action='store_true',
+        help='Memory-map input files and decode request/response data only when needed,'
+             ' so trimmed ones are never decoded. Applies to regular files parsed in-process.'
+    )
+    parser.add_argument(
+        '--no-bodies', '--no_bodies',
+        action='store_true',
+        help='Drop request/response headers and bodies of alert instances while parsing,'
+             ' for output without them, using far less memory.'
+             ' NB: Instances differing by these only are merged then.'
+    )
+    parser.add_argument(
+        '--drop-fields', '--drop_fields',
+        type=lambda s: [f for f in s.split(',') if f],
+        default=list(),
+        metavar='FIELD[,...]',
+        help='Drop these string fields of alerts and/or instances (e.g. `description,solution,evidence`)'
+             ' while parsing, leaving them empty in output.'
+    )
+    parser.add_argument(
+        '--max-body-size', '--max_body_size',
+        type=int,
+        default=None,
+        metavar='CHARS',
+        help='Truncate request/response bodies longer than CHARS while parsing (headers are kept whole),'
+             ' noting their full length and SHA-256 digest instead of the rest.'
+    )
+    parser.add_argument(
+        '--store',
+        default=None,
+        metavar='PATH',
+        help='Ingest input reports into the persistent findings store (SQLite database) at PATH,'
+             ' then produce output merged from everything stored there. Files ingested before'
+             ' (same path, size and mtime) are skipped; parsing options must be the same as before.'
+    )
+    parser.add_argument(
+        '--cache-dir', '--cache_dir',
+        default=None,
+        metavar='DIR',
+        help='Cache structured input reports at DIR, to skip parsing of the same files next time.'
+    )
+    parser.add_argument(
+        '--cache-size', '--cache_size',
+        type=int,
+        default=1024,
+        metavar='MB',
+        help='Evict least recently used cache entries above this total size. Defaults to %(default)s.'
+    )
     parser_output_args = parser.add_mutually_exclusive_group(required=False)
     parser_output_args.add_argument(
         '-z', '--zap-original-output', '--zap_original_output',
@@ -115,29 +320,59 @@ def main():
         action='store_true',
         help='Produce OASIS SARIF (JSON) output.'
     )
+    parser.add_argument(
+        '--sarif-tables', '--sarif_tables',
+        action='store_true',
+        help='With -s, put distinct artifacts (URIs), web requests and responses once into run-level tables,'
+             ' results referring to them by index; output size then follows unique content.'
+    )
+    parser.add_argument(
+        '--sqlite',
+        default=None,
+        metavar='PATH',
+        help='Also export merged findings into a new SQLite database at PATH (replaced, if any),'
+             ' with sites, alerts, instances and bodies tables indexed for querying.'
+    )
+    parser.add_argument(
+        '--sarif-input', '--sarif_input',
+        action='store_true',
+        help='Input files are SARIF logs (e.g. by Nuclei, or by %(prog)s -s) to be merged into one:'
+             ' runs of the same tool combined, duplicate results dropped.'
+             ' Results are streamed, ZAP-specific options do not apply.'
+    )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help='Print wall/CPU time and object counts per stage (ingest, merge, output, ...) to STDERR as JSON;'
+             ' also recorded into SARIF output, at `conversion.invocation.properties`.'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Same as --stats, adding peak memory per stage, traced with `tracemalloc` (slows things down).'
+    )
     args = parser.parse_args()
+    if args.batch is not None and (
+        args.in_file != [sys.stdin] or args.out_file is not None or args.store is not None or args.sqlite is not None
+    ):
+        parser.error('--batch takes no input files, -o, --store or --sqlite')
+    if args.sarif_input and args.sqlite is not None:
+        parser.error('--sqlite does not apply to --sarif-input')
+    try:
+        Filter.parse(args.filter)
+        _projections(args.drop_fields)
+    except ValueError as e:
+        parser.error(str(e))
+    run = _run if args.batch is None else lambda args: 1 if batch(args) else None  # Exit status
 
-    zrs = [
-        preprocess(zr, exclude_alerts=args.x or DEFAULT_ALERTS_EXCLUDED)
-        for zr in map(ZapReport.from_json_file, args.in_file)
-    ]
-
-    zr_merged = merge(zrs, trim=not args.keep_data_full)
-
-    output_file = args.out_file
-    if output_file is None:
-        if args.in_file[0].name == '<stdin>':
-            output_file = sys.stdout
-        else:
-            first_input_file = Path(args.in_file[0].name)
-            output_file = first_input_file.with_stem(f'{first_input_file.stem}-m')
-
-    with (output_file if isinstance(output_file, TextIOWrapper) else open(output_file, 'w')) as fo:
-        if args.sarif_output:
-            fo.write(transmodel(zr_merged).json())
-        else:
-            fo.write(zr_merged.json_orig() if args.zap_original_output else zr_merged.json())
+    if not (args.stats or args.profile):
+        return run(args)
+    from .zrstats import collecting_stats
+    with collecting_stats(memory=args.profile) as stats:
+        status = run(args)
+    print(json.dumps({'stages': stats.asdict()}, indent=4), file=sys.stderr)
+    return status
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
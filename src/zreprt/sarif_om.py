@@ -5,7 +5,6 @@ This module adds typing annotations for convenience with cattrs-structuring.
 """
 
 import sys
-from io import TextIOWrapper
 from typing import Optional
 
 from attrs import define, field, fields, has
@@ -14,6 +13,8 @@ from cattrs.gen import make_dict_structure_fn, make_dict_unstructure_fn, overrid
 from cattrs.preconf.json import make_converter
 from sarif_om import *
 
+from . import zrio
+
 
 # Module variable allows user to select __repr__,
 # either defined here or original one.
@@ -191,7 +192,7 @@ class SarifLog:
 
     @classmethod
     def from_json_file(cls, f):
-        with (f if isinstance(f, TextIOWrapper) else open(f)) as fo:
+        with zrio.open_input(f) as fo:  # Decompressing, if needed
             try:
                 return conv.loads(fo.read(), cls)
             except BaseValidationError as e:
@@ -2,15 +2,18 @@
 
 import logging
 import re
-from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime, timezone
+from functools import lru_cache
 # from datetime import datetime, UTC  # `UTC` Added in 3.11
 
 from attrs import define, field
 
-from . import __version__
+from . import __version__, zrjson
 from .sarif_om import *
-from .zrlog import notii, _SarifNotificationKeeper
+from .zrlog import collecting_notii, notii, renotify
+from .zreprt import _truncated, _untruncated
+from .zrstats import current_stats, timed
 
 
 _THIS_TOOL_COMPONENT = ToolComponent(
@@ -58,16 +61,49 @@ def _back_compat_trick(web_rr_parse_func):
     return foo
 
 
+_HEADER_BLOCK_CACHED_MAX = 4096  # Chars, so that the cache of 4096 blocks holds ~16M chars at most
+
+
+def _parse_header_block(zhdr, start_line_p):
+    """Split header block of HTTP message into start line (with its groups) and headers (ok/nok).
+
+    Memoized (but for blocks too long), since many instances carry byte-identical header blocks,
+    thus no notifications here: it is up to the callers to emit them each time.
+    Headers are given as tuples, not to be shared: callers make their own lists of them.
+    """
+    if len(zhdr) > _HEADER_BLOCK_CACHED_MAX:
+        return _split_header_block(zhdr, start_line_p)
+    return _split_header_block_cached(zhdr, start_line_p)
+
+
+def _split_header_block(zhdr, start_line_p):
+    hdr_lines = list(filter(None, zhdr.splitlines(keepends=False)))
+    start_line = (hdr_lines or ['',]).pop(0)
+
+    if not ((m := start_line_p.match(start_line)) and len(m.groups()) == 3):
+        return None
+
+    hdr_lines_split = [tuple(line.split(':', maxsplit=1)) for line in hdr_lines]
+    return (
+        start_line,
+        m.groups(),
+        tuple(h for h in hdr_lines_split if len(h) == 2),
+        tuple(h for h in hdr_lines_split if len(h) != 2),
+    )
+
+
+_split_header_block_cached = lru_cache(maxsize=4096)(_split_header_block)
+
+
+@timed('sarif_http')
 @_back_compat_trick
 def _web_request(zhdr, zbody):
     r = WebRequest()
     raw_data = dict()
 
-    hdr_lines = list(filter(None, zhdr.splitlines(keepends=False)))
-    start_line = (hdr_lines or ['',]).pop(0)
-
-    if (m := REQUEST_LINE_P.match(start_line)) and len(m.groups()) == 3:
-        r.method, r.target, protocol_version = m.groups()  # <method> <request-target> <protocol>
+    if parsed := _parse_header_block(zhdr, REQUEST_LINE_P):
+        # <method> <request-target> <protocol>
+        start_line, (r.method, r.target, protocol_version), hdrs_ok, hdrs_nok = parsed
     else:
         notii.warning('Failed to parse start line of request header. Ref. to WebRequest.properties for raw-data.')
         raw_data.update({'request_header': zhdr, 'request_body': zbody})
@@ -80,12 +116,11 @@ def _web_request(zhdr, zbody):
         notii.warning('Failed to parse protocol/version at request header. Ref. to WebRequest.properties for raw-data.')
         raw_data.update({'start_line': start_line})
 
-    hdr_lines_split = [line.split(':', maxsplit=1) for line in hdr_lines]
-    if hdrs_ok := [h for h in hdr_lines_split if len(h) == 2]:
-        r.headers = hdrs_ok
-    if hdrs_nok := [h for h in hdr_lines_split if len(h) != 2]:
+    if hdrs_ok:
+        r.headers = [list(h) for h in hdrs_ok]
+    if hdrs_nok:
         notii.warning('Failed to parse request header(s). Ref. to WebRequest.properties for raw-data.')
-        raw_data.update({'headers': hdrs_nok})
+        raw_data.update({'headers': [list(h) for h in hdrs_nok]})
 
     if zbody:
         # TODO/WARN: Maybe there is more proper place for such data
@@ -98,16 +133,15 @@ def _web_request(zhdr, zbody):
     return r
 
 
+@timed('sarif_http')
 @_back_compat_trick
 def _web_response(zhdr, zbody, no_response=False):
     r = WebResponse()
     raw_data = dict()
 
-    hdr_lines = list(filter(None, zhdr.splitlines(keepends=False)))
-    start_line = (hdr_lines or ['',]).pop(0)
-
-    if (m := RESPONSE_LINE_P.match(start_line)) and len(m.groups()) == 3:
-        protocol_version, r.status_code, r.reason_phrase = m.groups()  # <protocol> <status-code> <status-text>
+    if parsed := _parse_header_block(zhdr, RESPONSE_LINE_P):
+        # <protocol> <status-code> <status-text>
+        start_line, (protocol_version, r.status_code, r.reason_phrase), hdrs_ok, hdrs_nok = parsed
     else:
         notii.warning('Failed to parse start line of response header. Ref. to WebResponse.properties for raw-data.')
         raw_data.update({'response_header': zhdr, 'response_body': zbody})
@@ -120,12 +154,11 @@ def _web_response(zhdr, zbody, no_response=False):
         notii.warning('Failed to parse protocol/version at response header. Ref. to WebResponse.properties for raw-data.')
         raw_data.update({'start_line': start_line})
 
-    hdr_lines_split = [line.split(':', maxsplit=1) for line in hdr_lines]
-    if hdrs_ok := [h for h in hdr_lines_split if len(h) == 2]:
-        r.headers = hdrs_ok
-    if hdrs_nok := [h for h in hdr_lines_split if len(h) != 2]:
+    if hdrs_ok:
+        r.headers = [list(h) for h in hdrs_ok]
+    if hdrs_nok:
         notii.warning('Failed to parse response header(s). Ref. to WebResponse.properties for raw-data.')
-        raw_data.update({'headers': hdrs_nok})
+        raw_data.update({'headers': [list(h) for h in hdrs_nok]})
 
     if zbody:
         # TODO/WARN: Maybe there is more proper place for such data
@@ -140,13 +173,88 @@ def _web_response(zhdr, zbody, no_response=False):
     return r
 
 
-def transmodel(zr):
-    ts0 = datetime.now(timezone.utc).isoformat()
-    # ts0 = datetime.now(UTC).isoformat()  # `UTC` Added in 3.11
+def _http_message(parse, zhdr, zbody, names, max_body_size=None):
+    """Parse HTTP message with `parse` (`_web_request`/`_web_response`), with its body
+    truncated to `max_body_size` chars, if given; truncation info goes to its `properties`."""
+    if max_body_size is not None:
+        zbody = _truncated(zbody, max_body_size)
+    infos, parts = dict(), list()
+    for name, v in zip(names, (zhdr, zbody)):
+        v, infos[name] = _untruncated(v)
+        parts.append(v)
+    r = parse(*parts)
+    if infos := {k: v for k, v in infos.items() if v}:
+        r.properties = {**(r.properties or dict()), 'truncated': infos}
+    return r
+
 
-    rules = [
-        ReportingDescriptor(
-            id=str(alert.pluginid) or alert.alertref,  # TODO/WARN: pluginid-vs-alertref,
+def _request_of(alein, max_body_size=None):
+    return _http_message(
+        _web_request, alein.request_header, alein.request_body,
+        ('request_header', 'request_body'), max_body_size,
+    )
+
+
+def _response_of(alein, max_body_size=None):
+    return _http_message(
+        _web_response, alein.response_header, alein.response_body,
+        ('response_header', 'response_body'), max_body_size,
+    )
+
+
+class _RunTables:
+    """Run-level tables of distinct artifacts, web requests and responses,
+    filled while converting results, which refer to them by index.
+
+    Notifications of making an entry are counted for every reference to it,
+    the same as for inline ones.
+    """
+
+    def __init__(self, max_body_size=None):
+        self.max_body_size = max_body_size
+        self.artifacts, self.web_requests, self.web_responses = list(), list(), list()
+        self._ixs = dict()  # (table, key) -> (index, notification counts)
+
+    def _index(self, table, key, make):
+        if (entry := self._ixs.get((table, key))) is None:
+            rows = getattr(self, table)
+            with collecting_notii() as notifications:
+                rows.append(make())
+            entry = self._ixs[(table, key)] = (len(rows) - 1, notifications.counts or None)
+        ix, counts = entry
+        if counts:
+            renotify(counts)
+        return ix
+
+    def artifact_location(self, uri):
+        return ArtifactLocation(index=self._index(
+            'artifacts', uri, lambda: Artifact(location=ArtifactLocation(uri=uri))))
+
+    def web_request(self, alein):
+        return WebRequest(index=self._index(
+            'web_requests', (alein.request_header, alein.request_body),
+            lambda: _request_of(alein, self.max_body_size)))
+
+    def web_response(self, alein):
+        return WebResponse(index=self._index(
+            'web_responses', (alein.response_header, alein.response_body),
+            lambda: _response_of(alein, self.max_body_size)))
+
+
+def _rule_id(alert):
+    return str(alert.pluginid) or alert.alertref  # TODO/WARN: pluginid-vs-alertref
+
+
+def _rules(zr):
+    """Rules for the alerts, one per rule id (described by the first alert of it),
+    and their indexes by rule id."""
+    rules, rule_ixs = list(), dict()
+    for alert in zr.site[0].alerts:
+        if (rule_id := _rule_id(alert)) in rule_ixs:
+            continue
+        rule_ixs[rule_id] = len(rules)
+        rules.append(ReportingDescriptor(
+            id=rule_id,
             name=alert.name or alert.alert,
             short_description=MultiformatMessageString(text=alert.alert or alert.name),
             full_description=MultiformatMessageString(text=alert.description),
@@ -168,17 +276,21 @@ def transmodel(zr):
             } or None,
             # default_configuration=,  # zap: level
             # relationships=,  # zap: refs to cwe in its taxonomy
-        ) for alert in zr.site[0].alerts
-    ]
+        ))
+    return rules, rule_ixs
+
 
-    results = [
+def _results(zr, rule_ixs, max_body_size=None, tables=None):
+    """Results for the alert instances, with artifact locations and web requests/responses
+    either inline or referring to `tables`, if given."""
+    return (
         Result(
             level=ALERT_LEVEL_NORM(alert.riskcode),
             locations=[
                 Location(
                     physical_location=PhysicalLocation(
-                        artifact_location=ArtifactLocation(
-                            uri=alein.uri
+                        artifact_location=(
+                            tables.artifact_location(alein.uri) if tables else ArtifactLocation(uri=alein.uri)
                         ),
                         # region=Region(snippet=ArtifactContent(text=alein.evidence)) if alein.evidence else None,
                     ),
@@ -191,45 +303,54 @@ def transmodel(zr):
                 ),
             ],
             message=Message(text=alert.description),
-            rule_id=str(alert.pluginid) or alert.alertref,  # TODO/WARN: pluginid-vs-alertref
+            rule_id=_rule_id(alert),
+            rule_index=rule_ixs[_rule_id(alert)],
             **(
-                {'web_request': _web_request(alein.request_header, alein.request_body)}
+                {'web_request': tables.web_request(alein) if tables else _request_of(alein, max_body_size)}
                 if alein.request_header or alein.request_body else {}
             ),
             **(
-                {'web_response': _web_response(alein.response_header, alein.response_body)}
+                {'web_response': tables.web_response(alein) if tables else _response_of(alein, max_body_size)}
                 if alein.response_header or alein.response_body else {}
             ),
         )
         for alert in zr.site[0].alerts for alein in alert.instances
-    ]
+    )
+
 
-    # WARN: Order matters: Conversion summary should be constructed
-    # after other entities, since it includes the notifications log.
+def _conversion(ts0, notifications):
     ts1 = datetime.now(timezone.utc).isoformat()
     # ts1 = datetime.now(UTC).isoformat()  # `UTC` Added in 3.11
-    conv_info = Conversion(
+    return Conversion(
         tool=_THIS_TOOL_COMPONENT,
         invocation=Invocation(
             start_time_utc=ts0,
             end_time_utc=ts1,
             tool_execution_notifications=[
                 Notification(Message(text=f'{levelname} (x{n}) {msg}'))
-                for (levelname, msg), n in Counter(
-                    (r.levelname, r.msg) for r in _SarifNotificationKeeper.sarif_notii).items()
+                for (levelname, msg), n in notifications.counts.items()
             ],
             # tool_configuration_notifications=[Notification(Message(
             #     text='...note on excludes and trimming performed...')),],
             execution_successful=True,
+            # Stages completed by now, when stats are collected
+            properties={'stats': stats.asdict()} if (stats := current_stats()) else None,
         ),
     )
 
+
+def _sarif_log(zr, rules, results, conv_info, tables=None):
     return SarifLog(
         schema_uri=_SARIF_SCH,
         version=_SARIF_SCH_VER,
         runs=[
             Run(
                 results=results,
+                **({
+                    'artifacts': tables.artifacts,
+                    'web_requests': tables.web_requests,
+                    'web_responses': tables.web_responses,
+                } if tables else {}),
                 # taxonomies=,
                 tool=Tool(
                     driver=ToolComponent(
@@ -244,3 +365,59 @@ def transmodel(zr):
             ),
         ],
     )
+
+
+@contextmanager
+def _header_blocks_cached():
+    """Release header blocks cached, once the conversion is done."""
+    try:
+        yield
+    finally:
+        _split_header_block_cached.cache_clear()
+
+
+def transmodel(zr, max_body_size=None, tables=False):
+    """Convert ZAP-like report to SARIF.
+
+    Request/response bodies longer than `max_body_size` chars get truncated,
+    noted at `properties.truncated` of `WebRequest`/`WebResponse` (as those truncated before).
+    With `tables`, distinct artifacts, web requests and responses are put once into
+    `run.artifacts`, `run.web_requests`, `run.web_responses`, and results refer to them by index.
+    Notifications are collected per call, so it is safe to run concurrently in threads.
+    """
+    ts0 = datetime.now(timezone.utc).isoformat()
+    # ts0 = datetime.now(UTC).isoformat()  # `UTC` Added in 3.11
+
+    with collecting_notii() as notifications, _header_blocks_cached():
+        rules, rule_ixs = _rules(zr)
+        run_tables = _RunTables(max_body_size) if tables else None
+        results = list(_results(zr, rule_ixs, max_body_size, run_tables))
+
+        # WARN: Order matters: Conversion summary should be constructed
+        # after other entities, since it includes the notifications log.
+        return _sarif_log(zr, rules, results, _conversion(ts0, notifications), run_tables)
+
+
+def transmodel_dump(zr, fo, max_body_size=None, tables=False):
+    """Convert and write SARIF to `fo`, producing `runs[0].results` one by one.
+
+    Unlike `transmodel(zr).json()`, results are unstructured and written
+    as soon as converted, never held all at once. The `conversion` summary
+    goes after the results, since it includes the notifications log,
+    and so do the run-level tables (with `tables`), filled while converting results.
+    """
+    ts0 = datetime.now(timezone.utc).isoformat()
+    # ts0 = datetime.now(UTC).isoformat()  # `UTC` Added in 3.11
+
+    with collecting_notii() as notifications, _header_blocks_cached():
+        rules, rule_ixs = _rules(zr)
+        sarif_d = conv.unstructure(_sarif_log(zr, rules, [], None))
+        run_d = sarif_d['runs'][0]
+        run_tables = _RunTables(max_body_size) if tables else None
+        run_d['results'] = map(conv.unstructure, _results(zr, rule_ixs, max_body_size, run_tables))
+        if run_tables:
+            run_d['artifacts'] = lambda: conv.unstructure(run_tables.artifacts)
+            run_d['webRequests'] = lambda: conv.unstructure(run_tables.web_requests)
+            run_d['webResponses'] = lambda: conv.unstructure(run_tables.web_responses)
+        run_d['conversion'] = lambda: conv.unstructure(_conversion(ts0, notifications))
+        zrjson.dump(sarif_d, fo)
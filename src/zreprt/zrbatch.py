@@ -0,0 +1,89 @@
+"""Batch conversion of directory trees of reports, skipping unchanged ones.
+
+Report files (`*.json`, possibly compressed) of each directory make a group,
+merged into "<filename>-m.<ext>" after the first of them (compression suffix kept last),
+as the CLI names its output.
+Content hashes of the inputs, along with the options used, are kept in a manifest
+at the tree root, so that groups with neither changed are skipped next time.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from . import __version__
+from .zrio import _EXTENSIONS
+
+
+MANIFEST_NAME = '.zreprt-manifest.json'
+_SUFFIXES = ('.json', *(f'.json{ext}' for ext in _EXTENSIONS))
+
+
+def output_path(path):
+    """Default output path for input `path`: "<filename>-m.<ext>" for "<filename>.<ext>",
+    with compression suffix kept last, e.g. "zap-m.json.gz" for "zap.json.gz"."""
+    path = Path(path)
+    comp = path.suffix if path.suffix.lower() in _EXTENSIONS else ''
+    inner = Path(path.name[:len(path.name) - len(comp)])
+    return path.with_name(f'{inner.stem}-m{inner.suffix}{comp}')
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fo:
+        while chunk := fo.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def report_groups(root):
+    """Yield (dir, sorted report paths) of directories under `root` having any, in walk order.
+
+    Hidden files and directories are skipped, and so are outputs of other files there.
+    """
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(d for d in dir_names if not d.startswith('.'))
+        candidates = sorted(
+            Path(dir_path) / name for name in file_names
+            if not name.startswith('.') and name.lower().endswith(_SUFFIXES)
+        )
+        outputs = {output_path(p).name for p in candidates}
+        if paths := [p for p in candidates if p.name not in outputs]:
+            yield Path(dir_path), paths
+
+
+class Manifest:
+    """Inputs (by content hash) and options each output under `root` was last produced from,
+    kept as JSON at `root/MANIFEST_NAME`; keyed by output paths relative to `root`.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.path = self.root / MANIFEST_NAME
+        try:
+            with open(self.path) as fo:
+                self.groups = json.load(fo)['groups']
+        except (FileNotFoundError, ValueError, KeyError, TypeError):  # None or damaged: convert everything
+            self.groups = dict()
+
+    def key(self, path):
+        return Path(path).relative_to(self.root).as_posix()
+
+    def entry(self, paths, options):
+        """Manifest entry of an output to be produced from `paths` with `options`."""
+        return {
+            'version': __version__,
+            'options': options,
+            'inputs': {self.key(p): file_digest(p) for p in paths},
+        }
+
+    def is_current(self, out_path, entry):
+        """Whether `out_path` exists, as produced from the same inputs and options as `entry` says."""
+        return self.groups.get(self.key(out_path)) == entry and Path(out_path).is_file()
+
+    def save(self):
+        with tempfile.NamedTemporaryFile('w', dir=self.root, prefix=MANIFEST_NAME, delete=False) as fo:
+            json.dump({'groups': self.groups}, fo, indent=4, sort_keys=True)
+        os.replace(fo.name, self.path)
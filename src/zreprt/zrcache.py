@@ -0,0 +1,82 @@
+"""On-disk cache of structured reports, to skip parsing of the same files again."""
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from . import __version__
+from .zreprt import ZapReport
+
+
+class ParseCache:
+    """Cache of `from_json_file` results, pickled to `cache_dir`.
+
+    Entries are keyed by the content hash of the file parsed, the class parsed into,
+    parsing options affecting the result (fields dropped, bodies truncated, filter), and zreprt version.
+    Least recently used ones are evicted once all of them take more than `max_size` bytes.
+    """
+
+    def __init__(self, cache_dir, max_size=1 << 30):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+
+    def _entry(self, path, cls, drop_fields=(), max_body_size=None, flt=None):
+        h = hashlib.sha256(
+            f'{__version__}:{cls.__module__}.{cls.__qualname__}:'
+            f'{",".join(sorted(drop_fields))}:{max_body_size}:'
+            f'{json.dumps(flt.terms()) if flt is not None else ""}:'.encode()
+        )
+        with open(path, 'rb') as fo:
+            while chunk := fo.read(1 << 20):
+                h.update(chunk)
+        return self.cache_dir / f'{h.hexdigest()}.pickle'
+
+    def load(self, f, cls=ZapReport, **kwargs):
+        """Same as `cls.from_json_file(f, **kwargs)`, cached when `f` is (or names) a regular file.
+
+        NB: Reports got from the cache have all their request/response data decoded.
+        """
+        path = getattr(f, 'name', f)
+        if not isinstance(path, (str, os.PathLike)) or not os.path.isfile(path):
+            return cls.from_json_file(f, **kwargs)
+
+        entry = self._entry(path, cls, kwargs.get('drop_fields', ()), kwargs.get('max_body_size'), kwargs.get('flt'))
+        try:
+            with open(entry, 'rb') as fo:
+                obj = pickle.load(fo)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        else:
+            os.utime(entry)
+            if hasattr(f, 'close'):
+                f.close()
+            return obj
+
+        if (obj := cls.from_json_file(f, **kwargs)) is not None:
+            self._store(entry, obj)
+        return obj
+
+    def _store(self, entry, obj):
+        with tempfile.NamedTemporaryFile('wb', dir=self.cache_dir, suffix='.tmp', delete=False) as fo:
+            pickle.dump(obj, fo, pickle.HIGHEST_PROTOCOL)
+        os.replace(fo.name, entry)
+        self._evict()
+
+    def _evict(self):
+        entries = list()
+        for p in self.cache_dir.glob('*.pickle'):
+            try:
+                st = p.stat()
+            except FileNotFoundError:  # Evicted concurrently
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.max_size:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
@@ -14,68 +14,176 @@ See also:
 - https://www.zaproxy.org/docs/constants/
 """
 
+import hashlib
+import io
+import json
+import mmap
 import re
 from datetime import datetime, timezone
-from io import TextIOWrapper
+from functools import partial
 from typing import Optional
 
-import dateutil.parser
-from attrs import astuple, define, field
-from cattrs import Converter
+from attrs import NOTHING, define, evolve, field, fields, setters
+from cattrs import BaseValidationError, Converter
 from cattrs.gen import make_dict_structure_fn, make_dict_unstructure_fn, override
 from cattrs.preconf.json import make_converter
 
+from . import zrio, zrjson
+from .zrjson import JsonScanner
+from .zrstats import timed
 
+
+@timed('clns')
 def _clns(s, p=re.compile(r'</?p>(\s*</?p>)*')):
     """Clear single string of extra html tags."""
     return p.sub('\n', s)
 
 
+def _structure_ts(s, _):
+    import dateutil.parser  # Deferred, as quite heavy to import
+    return ts if (ts := dateutil.parser.parse(s)).tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
 _zlike_conv = make_converter(prefer_attrib_converters=True)
 # _zlike_conv.register_unstructure_hook(datetime, lambda dt: dt.isoformat())  # cattrs.preconf.json does this
-_zlike_conv.register_structure_hook(datetime, lambda s, _: ts if (ts := dateutil.parser.parse(s)).tzinfo
-                                                              else ts.replace(tzinfo=timezone.utc))  # noqa: E127
+_zlike_conv.register_structure_hook(datetime, _structure_ts)
 _zorig_conv = _zlike_conv.copy()
 
+# Heavy fields of alert instance, with their ZAP original names
+_BODY_FIELDS = ('request_header', 'request_body', 'response_header', 'response_body')
+_BODY_KEYS = {k: f for f in _BODY_FIELDS for k in (f, f.replace('_', '-'))}
+
+
+def _digest(b):
+    return hashlib.blake2b(b, digest_size=16).digest()
+
+
+# Fields capped by `max_body_size`: headers are kept whole, as cutting them would break their parsing
+_CAPPED_FIELDS = ('request_body', 'response_body')
+_TRUNCATED_P = re.compile(r'\n\[zreprt: truncated, (\d+) chars, sha256:([0-9a-f]{64})\]\Z')
+_TRUNCATED_TAIL = 120  # Long enough for the note above
+
+
+def _truncated(s, max_size):
+    """`s` cut to `max_size` chars, if longer, noting its full length and SHA-256 digest."""
+    if not s or len(s) <= max_size or _untruncated(s)[1]:
+        return s
+    return f'{s[:max_size]}\n[zreprt: truncated, {len(s)} chars, sha256:{hashlib.sha256(s.encode()).hexdigest()}]'
+
+
+def _untruncated(s):
+    """Content of (maybe) truncated `s` and its truncation info, if any."""
+    if s and s.endswith(']') and (m := _TRUNCATED_P.search(s, max(0, len(s) - _TRUNCATED_TAIL))):
+        return s[:m.start()], {'length': int(m[1]), 'sha256': m[2]}
+    return s, None
+
+
+def _truncate_instance(ai, max_size):
+    """Truncate request/response bodies of the instance to `max_size` chars each,
+    leaving short enough undecoded ones as they are."""
+    for name in _CAPPED_FIELDS:
+        if isinstance(v := ai._raw(name), _LazyBody) and v.end - v.start - 2 <= max_size:
+            continue  # No more chars than bytes
+        if v and len(v := getattr(ai, name)) > max_size:
+            setattr(ai, name, _truncated(v, max_size))
+    return ai
+
+
+class _LazyBody:
+    """JSON string within a (memory-mapped) buffer, to be decoded when needed."""
+
+    __slots__ = ('buf', 'start', 'end')
+
+    def __init__(self, buf, start, end):
+        self.buf, self.start, self.end = buf, start, end
+
+    def __bool__(self):
+        return self.end - self.start > 2  # Not just quotes
+
+    def decode(self):
+        return json.loads(self.buf[self.start:self.end])
+
+    def digest(self):
+        """Same as of the decoded string, without decoding when there are no escapes."""
+        raw = self.buf[self.start + 1:self.end - 1]
+        return _digest(self.decode().encode() if b'\\' in raw else raw)
+
+
+def _lazy_fields(*names):
+    """Class decorator making given fields of slotted attrs class accept `_LazyBody`s,
+    decoded and stored in place on first attribute access.
+
+    Raw values remain available with `_raw(name)` method.
+    """
+    def decorator(cls):
+        slots = {name: getattr(cls, name) for name in names}
+
+        def lazy_property(slot):
+            def fget(self):
+                if isinstance(v := slot.__get__(self), _LazyBody):
+                    slot.__set__(self, v := v.decode())
+                return v
+            return property(fget, slot.__set__)
+
+        for name, slot in slots.items():
+            setattr(cls, name, lazy_property(slot))
+        cls._raw = lambda self, name: slots[name].__get__(self)
+        return cls
+    return decorator
+
 
 def _fallback_field(
     old_to_new_field: dict[str, str],
     zap_like_report_converter: Converter = _zlike_conv,
     zap_orig_report_converter: Converter = _zorig_conv,
 ):
-    """Ref: https://catt.rs/en/stable/usage.html#using-fallback-key-names"""
+    """Ref: https://catt.rs/en/stable/usage.html#using-fallback-key-names
+
+    Un/structuring functions are generated on first use, not at import time.
+    """
     def decorator(cls):
-        struct = make_dict_structure_fn(cls, zap_like_report_converter)
-
-        def structure(d, cl):
-            # if set(d.keys()) & set(old_to_new_field.keys()):
-            for old_field, new_field in old_to_new_field.items():
-                if old_field in d:
-                    d[new_field] = d[old_field]
-            return struct(d, cl)
-
-        zap_like_report_converter.register_structure_hook(cls, structure)
-
-        unstruct = make_dict_unstructure_fn(
-            cls,
-            zap_orig_report_converter,
-            **{
-                new_field: override(rename=old_field) for old_field, new_field in old_to_new_field.items()
-            },
+        def structure_factory(_cl):
+            struct = make_dict_structure_fn(cls, zap_like_report_converter)
+
+            def structure(d, cl):
+                # if set(d.keys()) & set(old_to_new_field.keys()):
+                for old_field, new_field in old_to_new_field.items():
+                    if old_field in d:
+                        d[new_field] = d[old_field]
+                return struct(d, cl)
+            return structure
+
+        zap_like_report_converter.register_structure_hook_factory(lambda t: t is cls, structure_factory)
+        cls._field_aliases = old_to_new_field
+
+        zap_orig_report_converter.register_unstructure_hook_factory(
+            lambda t: t is cls,
+            lambda _cl: make_dict_unstructure_fn(
+                cls,
+                zap_orig_report_converter,
+                **{
+                    new_field: override(rename=old_field) for old_field, new_field in old_to_new_field.items()
+                },
+            ),
         )
-        zap_orig_report_converter.register_unstructure_hook(cls, unstruct)
 
         return cls
     return decorator
 
 
+def _forget_fingerprint(inst, _attrib, value):
+    inst._fingerprint = None
+    return value
+
+
 @_fallback_field({
     "request-header": "request_header",
     "request-body": "request_body",
     "response-header": "response_header",
     "response-body": "response_body",
 })
-@define(order=True)
+@_lazy_fields(*_BODY_FIELDS)
+@define(order=True, on_setattr=setters.pipe(setters.convert, setters.validate, _forget_fingerprint))
 class ZapAlertInstance:
     uri: str
     method: str
@@ -87,9 +195,30 @@ class ZapAlertInstance:
     request_body: Optional[str] = field(default=None, repr=False)
     response_header: Optional[str] = field(default=None, repr=False)
     response_body: Optional[str] = field(default=None, repr=False)
+    _fingerprint: Optional[tuple] = field(
+        default=None, init=False, repr=False, eq=False, order=False, on_setattr=setters.NO_OP)
+
+    @property
+    def fingerprint(self):
+        """Value identifying the instance, with request/response digested;
+        computed once, then cached until any field is set."""
+        if self._fingerprint is None:
+            self._fingerprint = (
+                self.uri, self.method, self.param, self.attack, self.evidence, self.otherinfo,
+                *(
+                    b'' if v is None else v.digest() if isinstance(v, _LazyBody) else _digest(v.encode())
+                    for v in map(self._raw, _BODY_FIELDS)
+                ),
+            )
+        return self._fingerprint
+
+    @property
+    def has_http_data(self):
+        """Whether there is any request/response data, not decoding it."""
+        return any(map(self._raw, _BODY_FIELDS))
 
     def __hash__(self):
-        return hash(astuple(self))
+        return hash(self.fingerprint)
 
 
 @_fallback_field({
@@ -147,16 +276,294 @@ class ZapReport:
     site: list[ZapSite] = field(factory=list)
 
     @classmethod
-    def from_json_file(cls, f):
-        with (f if isinstance(f, TextIOWrapper) else open(f)) as fo:
-            return _zlike_conv.loads(fo.read(), cls)
+    def from_json_file(cls, f, bodies=None, lazy=False, drop_fields=(), max_body_size=None, flt=None):
+        """Parse report from a file (object or path).
+
+        Compressed files (gzip, bzip2, xz) are decompressed on the fly.
+        With `lazy`, a regular (uncompressed) file is memory-mapped and instances' request/response
+        are only decoded when accessed (never, for the trimmed ones).
+        String fields of alerts and instances named in `drop_fields` (e.g. request/response ones)
+        are skipped while parsing, getting their defaults (or empty strings) instead.
+        Request/response bodies longer than `max_body_size` chars get truncated,
+        noting their full length and SHA-256 digest at the end.
+        Sites, alerts and instances rejected by `flt` (see `zrfilter.Filter`) are skipped while parsing.
+        """
+        with zrio.open_input(f) as fo:
+            if lazy and isinstance(fo, (io.BufferedReader, io.FileIO)):  # Not a decompressing one
+                try:
+                    fo = mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ)
+                except (AttributeError, OSError, ValueError):
+                    pass  # Not a regular (non-empty) file, e.g. STDIN
+            return ZapReportReader(
+                fo, bodies=bodies, drop_fields=drop_fields, max_body_size=max_body_size, flt=flt).read()
 
     @classmethod
-    def from_dict(cls, d):
-        return _zlike_conv.structure(d, cls)
+    def from_dict(cls, d, drop_fields=(), max_body_size=None):
+        """Structure report from a dict, as `from_json_file` does with `drop_fields` and `max_body_size`."""
+        if drop_fields:
+            d = _projected_report(d, drop_fields)
+        zr = _zlike_conv.structure(d, cls)
+        if max_body_size is not None:
+            for ai in (ai for site in zr.site for a in site.alerts for ai in a.instances):
+                _truncate_instance(ai, max_body_size)
+        return zr
 
     def json(self):
         return _zlike_conv.dumps(self, indent=4, ensure_ascii=False)
 
     def json_orig(self):
         return _zorig_conv.dumps(self, indent=4, ensure_ascii=False)
+
+    def dump_json(self, fo):
+        """Write the same as `json()` to `fo`, alert by alert."""
+        self._dump(fo, _zlike_conv)
+
+    def dump_json_orig(self, fo):
+        """Write the same as `json_orig()` to `fo`, alert by alert."""
+        self._dump(fo, _zorig_conv)
+
+    def _dump(self, fo, conv):
+        d = conv.unstructure(evolve(self, site=[evolve(s, alerts=[]) for s in self.site]))
+        for site_d, site in zip(d['site'], self.site):
+            site_d['alerts'] = [partial(_alert_dict, conv, a) for a in site.alerts]
+        zrjson.dump(d, fo)
+
+
+def _alert_dict(conv, a):
+    """Unstructured alert, with instances unstructured one at a time while dumping."""
+    d = conv.unstructure(evolve(a, instances=[]))
+    d['instances'] = map(conv.unstructure, a.instances)
+    return d
+
+
+def _projection(cls, drop_fields):
+    """JSON keys (of both namings) of `cls` fields to be dropped, mapped to values to put instead:
+    their defaults, or empty strings for the required ones."""
+    aliases = {new: old for old, new in getattr(cls, '_field_aliases', dict()).items()}
+    proj = dict()
+    for a in fields(cls):
+        if a.name not in drop_fields:
+            continue
+        if a.type not in (str, Optional[str]):
+            raise ValueError(f'Field {cls.__name__}.{a.name} cannot be dropped, not a string one')
+        for key in (a.name, aliases.get(a.name)):
+            if key:
+                proj[key] = '' if a.default is NOTHING else a.default
+    return proj
+
+
+def _projections(drop_fields):
+    """Projections of `ZapAlertInfo` and `ZapAlertInstance` for `drop_fields`."""
+    drop_fields = set(drop_fields)
+    if unknown := drop_fields - {a.name for cls in (ZapAlertInfo, ZapAlertInstance) for a in fields(cls)}:
+        raise ValueError(f'Unknown fields to drop: {sorted(unknown)}')
+    return _projection(ZapAlertInfo, drop_fields), _projection(ZapAlertInstance, drop_fields)
+
+
+def _projected(d, proj):
+    return {k: proj[k] if k in proj else v for k, v in d.items()}
+
+
+def _projected_report(d, drop_fields):
+    """Copy of report dict with fields of alerts and instances dropped."""
+    drop_alert, drop_instance = _projections(drop_fields)
+    d = dict(d)
+    if 'site' in d:
+        d['site'] = sites = [dict(s) for s in d['site']]
+        for s in sites:
+            if 'alerts' in s:
+                s['alerts'] = alerts = [_projected(a, drop_alert) for a in s['alerts']]
+                for a in alerts:
+                    if 'instances' in a:
+                        a['instances'] = [_projected(ai, drop_instance) for ai in a['instances']]
+    return d
+
+
+class ZapReportReader:
+    """Incremental reader of ZAP(-like) JSON report.
+
+    Report headers are available as `report` right after construction
+    (ZAP writes them before the sites). Iterating over the reader
+    yields structured `ZapAlertInfo`s one at a time, while `site` refers
+    to the `ZapSite` being read; sites get appended to `report.site`,
+    but alerts are not kept anywhere unless the caller does so.
+
+    Instances' request/response get interned with `bodies` store, if given.
+    When reading from a buffer (e.g. mmap), they are kept undecoded
+    until accessed, referring to the buffer.
+
+    String fields of alerts and instances named in `drop_fields` are skipped
+    over undecoded, getting their defaults (or empty strings) instead.
+    Request/response bodies longer than `max_body_size` chars get truncated.
+
+    Sites, alerts and instances rejected by `flt` (see `zrfilter.Filter`) are skipped over
+    without being structured: alerts once their pluginid, riskcode and confidence are read
+    (ZAP writes them before instances), sites once their host is.
+
+    Data after the report is rejected with ValueError, unless reading from a scanner given.
+    """
+
+    def __init__(self, f, bodies=None, drop_fields=(), max_body_size=None, flt=None):
+        # Scanner given is to be positioned at the report (e.g. as an element of array)
+        self._whole = not isinstance(f, JsonScanner)
+        self._sc = JsonScanner(f) if self._whole else f
+        self._bodies = bodies
+        self._drop_alert, self._drop_instance = _projections(drop_fields)
+        self._max_body_size = max_body_size
+        self._flt = flt
+        self._lazy = self._sc.in_place
+        self._keys = self._sc.items()
+        self._hdrs = dict()
+        for key in self._keys:
+            if key == 'site':
+                self._at_site = True
+                break
+            self._hdrs[key] = self._sc.value()
+        else:
+            self._at_site = False
+        self.report = _zlike_conv.structure({**self._hdrs, 'site': []}, ZapReport)
+        self.site = None
+
+    def __iter__(self):
+        if self._at_site:
+            self._at_site = False
+            yield from self._sites()
+        late_hdrs = dict()
+        for key in self._keys:
+            if key == 'site':
+                yield from self._sites()
+            else:
+                late_hdrs[key] = self._sc.value()
+        if self._whole:
+            self._sc.end()  # As `json.loads` does
+        if late_hdrs:
+            zr = _zlike_conv.structure({**self._hdrs, **late_hdrs, 'site': []}, ZapReport)
+            for a in fields(ZapReport):
+                if a.name != 'site':
+                    setattr(self.report, a.name, getattr(zr, a.name))
+
+    def read(self):
+        """Read the (rest of) report, keeping alerts at their sites."""
+        for alert in self:
+            self.site.alerts.append(alert)
+        return self.report
+
+    def _rejects_site(self, hdrs):
+        return self._flt is not None and self._flt.rejects_site(hdrs)
+
+    def _sites(self):
+        for _ in self._sc.elements():
+            self.site, hdrs, pending = None, dict(), list()
+            for key in self._sc.items():
+                if key != 'alerts':
+                    hdrs[key] = self._sc.value()
+                    continue
+                if self._rejects_site(hdrs):
+                    for _ in self._sc.elements():
+                        self._alert(skip=True)
+                    continue
+                if self.site is None:
+                    try:
+                        self._new_site(hdrs)
+                    except BaseValidationError:
+                        pass  # Some site headers follow its alerts, see below
+                for _ in self._sc.elements():
+                    if (alert := self._alert()) is None:
+                        continue
+                    if self.site is None:
+                        pending.append(alert)
+                    else:
+                        yield alert
+            if self._rejects_site(hdrs):
+                continue
+            if self.site is None:
+                self._new_site(hdrs)
+            yield from pending
+
+    def _new_site(self, hdrs):
+        self.site = _zlike_conv.structure({**hdrs, 'alerts': []}, ZapSite)
+        self.report.site.append(self.site)
+
+    def _alert(self, skip=False):
+        """Alert read, or None if rejected by the filter (or to `skip` anyway)."""
+        d, instances, n_read, rejected, flt = dict(), list(), 0, skip, self._flt
+        for key in self._sc.items():
+            if key == 'instances':
+                if not rejected and flt is not None:
+                    rejected = flt.rejects_alert(d)
+                if rejected:
+                    for _ in self._sc.elements():
+                        self._sc.span()  # One by one, not to buffer them all
+                    continue
+                for n_read, _ in enumerate(self._sc.elements(), 1):
+                    if (ai := self._instance()) is not None:
+                        instances.append(ai)
+                if self._max_body_size is not None:
+                    for ai in instances:
+                        _truncate_instance(ai, self._max_body_size)
+                if self._bodies is not None:
+                    for ai in instances:
+                        self._bodies.intern_instance(ai)
+            elif rejected:
+                self._sc.span()
+            elif key in self._drop_alert:
+                self._sc.span()
+                d[key] = self._drop_alert[key]
+            else:
+                d[key] = self._sc.value()
+        if rejected or flt is not None and (flt.rejects_alert(d) or flt.filters_instances and not instances):
+            return None
+        if len(instances) < n_read and d.get('count') is not None:
+            d['count'] = len(instances)
+        alert = _zlike_conv.structure({**d, 'instances': []}, ZapAlertInfo)
+        alert.instances = instances
+        return alert
+
+    def _instance(self):
+        """Instance read, or None if rejected by the filter."""
+        if not self._lazy:
+            # Decoding it at once is faster than walking it key by key; dropped values are just transient then
+            d = self._sc.value()
+            if self._flt is not None and not self._flt.instance_ok(d.get('uri', '')):
+                return None
+            return _zlike_conv.structure(_projected(d, self._drop_instance), ZapAlertInstance)
+        d, lazy = dict(), dict()
+        for key in self._sc.items():
+            if key in self._drop_instance:
+                self._sc.span()
+                d[key] = self._drop_instance[key]
+            elif key in _BODY_KEYS and self._sc.peek() == b'"':
+                lazy[_BODY_KEYS[key]] = _LazyBody(self._sc.buf, *self._sc.span())
+            else:
+                d[key] = self._sc.value()
+        if self._flt is not None and not self._flt.instance_ok(d.get('uri', '')):
+            return None
+        ai = _zlike_conv.structure(d, ZapAlertInstance)
+        for name, v in lazy.items():
+            setattr(ai, name, v)
+        return ai
+
+
+class BodyStore:
+    """Store of request/response headers and bodies interned by content,
+    so that identical ones are shared between instances (and reports).
+
+    Keep the store no longer than parsing and merging take:
+    it holds every distinct body it has seen, including trimmed ones.
+    """
+
+    def __init__(self):
+        self._store = dict()
+
+    def __len__(self):
+        return len(self._store)
+
+    def intern(self, s):
+        return self._store.setdefault(s, s) if s else s
+
+    def intern_instance(self, ai):
+        for name in _BODY_FIELDS:
+            # Not yet decoded ones are left as is
+            if isinstance(v := ai._raw(name), str) and v and (v_interned := self.intern(v)) is not v:
+                setattr(ai, name, v_interned)
+        return ai
@@ -0,0 +1,163 @@
+"""Filters of findings, pushed down into parsing.
+
+`ZapReportReader` checks raw (JSON-decoded) values against a `Filter`,
+so that rejected sites, alerts and instances are skipped over
+before being structured; `preprocess` applies the same to structured reports.
+
+Filter expression terms:
+
+    plugin=ID[|ID...]       pluginid is one of these
+    plugin!=ID[|ID...]      pluginid is none of these
+    risk>=N                 riskcode is at least N (0-3, or info, low, medium, high)
+    confidence>=N           confidence is at least N (0-4, or falsepositive, low, medium, high, confirmed)
+    uri^=PREFIX             instance URI starts with PREFIX
+    uri~=REGEX              instance URI matches REGEX (searched for)
+    host=HOST[|HOST...]     site host is one of these
+
+Terms of different keys must all hold. Repeated terms of the same key
+add alternatives, any of which holds (e.g. `uri~=A` and `uri~=B` match
+either), except that `plugin!=` ones add exclusions, and of `risk>=`
+(or `confidence>=`) ones the highest applies.
+"""
+
+import re
+from typing import Optional
+
+from attrs import define, evolve, field
+
+
+_RISKS = {'info': 0, 'informational': 0, 'low': 1, 'medium': 2, 'high': 3}
+_CONFIDENCES = {'falsepositive': 0, 'low': 1, 'medium': 2, 'high': 3, 'confirmed': 4}
+_TERM_P = re.compile(r'\s*(\w+)\s*(>=|!=|\^=|~=|=)(.*)\Z', re.DOTALL)
+_TERM_OPS = {
+    ('plugin', '='), ('pluginid', '='), ('plugin', '!='), ('pluginid', '!='),
+    ('risk', '>='), ('riskcode', '>='), ('confidence', '>='),
+    ('uri', '^='), ('uri', '~='), ('host', '='),
+}
+
+
+def _level(v, names):
+    v = v.strip()
+    return names[v.lower()] if v.lower() in names else int(v)
+
+
+def _ints(v):
+    return frozenset(int(x) for x in v.split('|') if x.strip())
+
+
+@define(frozen=True)
+class Filter:
+    """Findings to keep: sites by `hosts`, alerts by `plugins` (all, if empty) not in `exclude_plugins`,
+    of at least `min_risk` and `min_confidence`, instances by `uri_prefixes` and `uri_regex`.
+    Criteria left empty do not apply. Alerts left with no instances are dropped.
+    """
+
+    plugins: frozenset = field(default=frozenset(), converter=frozenset)
+    exclude_plugins: frozenset = field(default=frozenset(), converter=frozenset)
+    min_risk: Optional[int] = None
+    min_confidence: Optional[int] = None
+    uri_prefixes: tuple = field(default=(), converter=tuple)
+    uri_regex: Optional[str] = None
+    hosts: frozenset = field(default=frozenset(), converter=frozenset)
+    _uri_re: Optional[re.Pattern] = field(init=False, default=None, eq=False, repr=False)
+
+    def __attrs_post_init__(self):
+        if self.uri_regex is not None:
+            object.__setattr__(self, '_uri_re', re.compile(self.uri_regex))
+
+    @classmethod
+    def parse(cls, terms):
+        """Filter of expression `terms` (see above), a list of them or a single one.
+
+        Raise ValueError for malformed ones.
+        """
+        kw = dict(plugins=set(), exclude_plugins=set(), uri_prefixes=list(), uri_regex=list(), hosts=set())
+        for term in [terms] if isinstance(terms, str) else terms:
+            if (m := _TERM_P.match(term)) is None:
+                raise ValueError(f'Malformed filter term: {term!r}')
+            key, op, v = m.groups()
+            if (key, op) not in _TERM_OPS:
+                raise ValueError(f'Unsupported filter term: {term!r}')
+            try:
+                if (key, op) in (('plugin', '='), ('pluginid', '=')):
+                    kw['plugins'] |= _ints(v)
+                elif (key, op) in (('plugin', '!='), ('pluginid', '!=')):
+                    kw['exclude_plugins'] |= _ints(v)
+                elif (key, op) in (('risk', '>='), ('riskcode', '>=')):
+                    kw['min_risk'] = max(kw.get('min_risk', 0), _level(v, _RISKS))
+                elif (key, op) == ('confidence', '>='):
+                    kw['min_confidence'] = max(kw.get('min_confidence', 0), _level(v, _CONFIDENCES))
+                elif (key, op) == ('uri', '^='):
+                    kw['uri_prefixes'].append(v)
+                elif (key, op) == ('uri', '~='):
+                    kw['uri_regex'].append(re.compile(v).pattern)
+                else:
+                    kw['hosts'] |= {h.strip() for h in v.split('|') if h.strip()}
+            except (ValueError, re.error) as e:
+                raise ValueError(f'Malformed filter term: {term!r}: {e}') from None
+        if regexes := kw.pop('uri_regex'):
+            kw['uri_regex'] = regexes[0] if len(regexes) == 1 else '|'.join(f'(?:{r})' for r in regexes)
+        return cls(**kw)
+
+    def terms(self):
+        """Filter expression terms, in canonical order: the same for equal filters."""
+        return [
+            *([f'plugin={"|".join(map(str, sorted(self.plugins)))}'] if self.plugins else []),
+            *([f'plugin!={"|".join(map(str, sorted(self.exclude_plugins)))}'] if self.exclude_plugins else []),
+            *([f'risk>={self.min_risk}'] if self.min_risk is not None else []),
+            *([f'confidence>={self.min_confidence}'] if self.min_confidence is not None else []),
+            *(f'uri^={p}' for p in self.uri_prefixes),
+            *([f'uri~={self.uri_regex}'] if self.uri_regex is not None else []),
+            *([f'host={"|".join(sorted(self.hosts))}'] if self.hosts else []),
+        ]
+
+    def excluding(self, plugins):
+        """The same filter, excluding `plugins` as well."""
+        return evolve(self, exclude_plugins=self.exclude_plugins | {int(p) for p in plugins})
+
+    @property
+    def filters_instances(self):
+        return bool(self.uri_prefixes) or self._uri_re is not None
+
+    def site_ok(self, host):
+        return not self.hosts or host in self.hosts
+
+    def alert_ok(self, pluginid=None, riskcode=None, confidence=None):
+        """Whether alert of these values is kept; None ones (e.g. not read yet) are not checked."""
+        return (
+            (
+                pluginid is None
+                or (not self.plugins or pluginid in self.plugins) and pluginid not in self.exclude_plugins
+            )
+            and (riskcode is None or self.min_risk is None or riskcode >= self.min_risk)
+            and (confidence is None or self.min_confidence is None or confidence >= self.min_confidence)
+        )
+
+    def instance_ok(self, uri):
+        return (
+            (not self.uri_prefixes or uri.startswith(self.uri_prefixes))
+            and (self._uri_re is None or self._uri_re.search(uri) is not None)
+        )
+
+    def rejects_alert(self, d):
+        """Whether raw alert `d` (maybe read partially) fails criteria of the values it has."""
+        return not self.alert_ok(*(
+            None if (v := d.get(k)) is None else int(v)
+            for k in ('pluginid', 'riskcode', 'confidence')
+        ))
+
+    def rejects_site(self, d):
+        """Whether raw site `d` (maybe read partially) has a host rejected."""
+        return (host := d.get('@host', d.get('host'))) is not None and not self.site_ok(host)
+
+    def alerts(self, alerts):
+        """Structured alerts kept, with instances kept."""
+        for a in alerts:
+            if not self.alert_ok(int(a.pluginid), int(a.riskcode), int(a.confidence)):
+                continue
+            if self.filters_instances:
+                if not (instances := [ai for ai in a.instances if self.instance_ok(ai.uri)]):
+                    continue
+                if len(instances) < len(a.instances):
+                    a = evolve(a, instances=instances, count=len(instances) if a.count is not None else None)
+            yield a
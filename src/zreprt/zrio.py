@@ -0,0 +1,64 @@
+"""Transparent (de)compression of report files: gzip, bzip2, xz/lzma.
+
+Input compression is detected by magic bytes, output one is chosen by file extension.
+Data is (de)compressed as a stream, never as a whole.
+"""
+
+from contextlib import contextmanager
+from importlib import import_module
+from pathlib import Path
+
+
+# Compression modules of stdlib, imported on use
+_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'lzma'),
+)
+_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'lzma',
+    '.lzma': 'lzma',
+}
+
+
+def compression(fo):
+    """Name of the module to decompress binary `fo` with, as detected by magic bytes
+    (peeked, or read and sought back); None for uncompressed data."""
+    if hasattr(fo, 'peek'):
+        head = fo.peek(6)[:6]
+    elif fo.seekable():
+        pos = fo.tell()
+        head = fo.read(6)
+        fo.seek(pos)
+    else:
+        return None
+    if not isinstance(head, bytes):
+        return None  # Text file object, having no binary buffer
+    return next((name for magic, name in _MAGIC if head.startswith(magic)), None)
+
+
+@contextmanager
+def open_input(f):
+    """Binary file object reading (decompressed) data of `f`, either path or file object
+    (binary or text one, e.g. STDIN); `f` is closed on exit.
+
+    Uncompressed files come as is, so that regular ones are still memory-mappable.
+    """
+    with (f if hasattr(f, 'read') else open(f, 'rb')) as fo:
+        fo = getattr(fo, 'buffer', fo)
+        if (name := compression(fo)) is None:
+            yield fo
+        else:
+            with import_module(name).open(fo, 'rb') as dfo:
+                yield dfo
+
+
+def open_output(f):
+    """Text file object to write to `f`: either path, compressed as its extension says, or open text file."""
+    if hasattr(f, 'write'):
+        return f
+    if (name := _EXTENSIONS.get(Path(f).suffix.lower())) is None:
+        return open(f, 'w')
+    return import_module(name).open(f, 'wt', encoding='utf-8')
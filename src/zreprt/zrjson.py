@@ -0,0 +1,187 @@
+"""Incremental JSON helpers for report-sized documents.
+
+Only the "skeleton" of a document is walked here token by token,
+while its elements of interest (alerts, instances, ...) are decoded
+one at a time with the stdlib `json`, so that the whole document
+never has to be held in memory.
+"""
+
+import json
+import mmap
+import re
+from collections.abc import Iterator
+
+
+_WS_P = re.compile(rb'[ \t\n\r]*')
+_NESTING_P = re.compile(rb'["\[\]{}]')
+_SCALAR_END_P = re.compile(rb'[\s,\]}]')
+
+
+class JsonScanner:
+    """Pull-scanner over JSON text, either as file-like object or as whole buffer.
+
+    File-likes are read in chunks (text ones are re-encoded to UTF-8),
+    while buffers (bytes, mmap) are scanned in place.
+
+    Containers are walked with `items()`/`elements()`, which yield
+    right before each member value; the caller must consume it exactly once,
+    either with `value()` or with nested `items()`/`elements()`.
+    """
+
+    def __init__(self, src, chunk_size=1 << 20):
+        self.in_place = isinstance(src, (bytes, bytearray, mmap.mmap))
+        if self.in_place:
+            self._src, self.buf = None, src
+        else:
+            self._src, self.buf = src, b''
+        self.chunk_size = chunk_size
+        self.pos = 0
+        self.offset = 0  # Absolute offset of `buf[0]` within the source
+
+    def _fill(self):
+        """Read more data, at least doubling the unscanned tail to keep rescans amortized."""
+        if self._src is None:
+            return False
+        chunk = self._src.read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not chunk:
+            self._src = None
+            return False
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        self.offset += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _error(self, msg):
+        return ValueError(f'{msg} at byte {self.offset + self.pos}')
+
+    def peek(self):
+        """Skip whitespace and return the next byte, `b''` at the end of data."""
+        while True:
+            self.pos = _WS_P.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def end(self):
+        """Check that nothing but whitespace is left."""
+        if self.peek():
+            raise self._error('Extra data')
+
+    def expect(self, token):
+        if self.peek() != token:
+            raise self._error(f'Expecting {token!r}')
+        self.pos += 1
+
+    def _str_end(self, pos):
+        buf = self.buf
+        i = pos + 1
+        while (i := buf.find(b'"', i)) >= 0:
+            j = i
+            while buf[j - 1] == 0x5c:  # Backslash
+                j -= 1
+            if (i - j) % 2 == 0:
+                return i + 1
+            i += 1
+        return -1
+
+    def _value_end(self, pos):
+        """Position right after the value starting at `pos`, or -1 when more data needed."""
+        lead = self.buf[pos:pos + 1]
+        if lead == b'"':
+            return self._str_end(pos)
+        if lead in (b'{', b'['):
+            depth = 0
+            while m := _NESTING_P.search(self.buf, pos):
+                if m.group() == b'"':
+                    if (pos := self._str_end(m.start())) < 0:
+                        return -1
+                    continue
+                pos = m.end()
+                depth += 1 if m.group() in b'{[' else -1
+                if not depth:
+                    return pos
+            return -1
+        m = _SCALAR_END_P.search(self.buf, pos)
+        return m.start() if m else -1
+
+    def span(self):
+        """Locate the next value, returning its `(start, end)` within `buf` and stepping over it."""
+        if not self.peek():
+            raise self._error('Expecting value')
+        while (end := self._value_end(self.pos)) < 0:
+            if not self._fill():
+                if self.buf[self.pos:self.pos + 1] in b'"{[':
+                    raise self._error('Unterminated value')
+                end = len(self.buf)
+                break
+        start, self.pos = self.pos, end
+        return start, end
+
+    def value(self):
+        """Decode the next value."""
+        start, end = self.span()
+        return json.loads(self.buf[start:end])
+
+    def items(self):
+        """Walk an object, yielding its keys."""
+        self.expect(b'{')
+        if self.peek() == b'}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(b':')
+            yield key
+            if (c := self.peek()) not in (b',', b'}'):
+                raise self._error("Expecting ',' or '}'")
+            self.pos += 1
+            if c == b'}':
+                return
+
+    def elements(self):
+        """Walk an array, yielding before each of its elements."""
+        self.expect(b'[')
+        if self.peek() == b']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if (c := self.peek()) not in (b',', b']'):
+                raise self._error("Expecting ',' or ']'")
+            self.pos += 1
+            if c == b']':
+                return
+
+
+def dump(obj, fo, indent=4):
+    """Serialize `obj` to `fo` the way `json.dump(obj, fo, indent=indent, ensure_ascii=False)` does,
+    additionally accepting iterators as arrays, written element by element as they are produced,
+    and callables, called to produce the value right when it is to be written.
+    """
+    _dump(obj, fo, indent, '\n')
+
+
+def _dump(obj, fo, indent, nl):
+    if callable(obj):
+        obj = obj()
+    if isinstance(obj, dict):
+        members = ((json.dumps(k, ensure_ascii=False) + ': ', v) for k, v in obj.items())
+        brackets, lazy = '{}', False
+    elif isinstance(obj, (list, tuple, Iterator)):
+        members = (('', v) for v in obj)
+        brackets, lazy = '[]', isinstance(obj, Iterator)
+    else:
+        fo.write(json.dumps(obj, ensure_ascii=False))
+        return
+    inner_nl = nl + ' ' * indent
+    sep = brackets[0]
+    for prefix, v in members:
+        fo.write(sep + inner_nl + prefix)
+        if lazy:
+            # Produced elements are plain data, no need to look inside
+            fo.write(json.dumps(v, indent=indent, ensure_ascii=False).replace('\n', inner_nl))
+        else:
+            _dump(v, fo, indent, inner_nl)
+        sep = ','
+    fo.write(nl + brackets[1] if sep == ',' else brackets)
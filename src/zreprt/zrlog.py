@@ -1,11 +1,47 @@
 import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class SarifNotifications:
+    """Log records of a single conversion, to be included into SARIF file,
+    aggregated into counts by (levelname, msg)."""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, record):
+        self.counts[(record.levelname, record.msg)] += 1
+
+
+# Notifications collector of the conversion running in current thread (or task)
+_sarif_notii = ContextVar('zreprt_sarif_notii', default=None)
+
+
+@contextmanager
+def collecting_notii():
+    """Collect notifications within the block, isolated per thread (task)
+    and restoring any outer collector on exit."""
+    token = _sarif_notii.set(collector := SarifNotifications())
+    try:
+        yield collector
+    finally:
+        _sarif_notii.reset(token)
+
+
+def renotify(counts):
+    """Count notifications again, as of `SarifNotifications.counts` given, with the current collector (if any)."""
+    if (collector := _sarif_notii.get()) is not None:
+        collector.counts.update(counts)
 
 
 class _SarifNotificationKeeper(logging.NullHandler):
-    sarif_notii = list()  # A tricky class-var to store log to be included into SARIF file
+    """Passes records to the current collector, if any; keeps nothing itself."""
 
-    def handle(self, *args):
-        self.__class__.sarif_notii.append(*args)
+    def handle(self, record):
+        if (collector := _sarif_notii.get()) is not None:
+            collector.add(record)
 
 
 logging.getLogger('zreprt.zr2sarif').addHandler(_SarifNotificationKeeper())
@@ -0,0 +1,299 @@
+"""Preprocessing and merging of reports, in memory or out of core.
+
+Reports are reduced to their last site by `preprocess`, then `merge` groups
+alerts of all of them by (risk, plugin, name, other info), deduplicating
+instances; `merge_external` does both for input files, within a memory budget.
+"""
+
+import heapq
+import os
+import pickle
+import sys
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+from attrs import astuple, evolve
+
+from .zreprt import ZapReport, ZapReportReader, ZapSite
+from .zrfilter import Filter
+from .zrio import open_input
+from .zrstats import stage
+
+
+DEFAULT_ALERTS_EXCLUDED = [
+    10109,  # Modern Web Application
+]
+
+
+def _empty_site():
+    return ZapSite(name='', host='', port='', ssl=False, alerts=list())
+
+
+def preprocess(zr, exclude_alerts=DEFAULT_ALERTS_EXCLUDED, flt=None):
+    """Keep the last site of report (of those accepted by `flt`, if given; an empty one, if none)
+    with alerts not excluded (and accepted), in place."""
+    if flt is not None:
+        zr.site = [s for s in zr.site if flt.site_ok(s.host)]
+    del zr.site[:-1]
+    if not zr.site:
+        zr.site.append(_empty_site())
+
+    # Exclude some alerts
+    zr.site[0].alerts = [
+        a for a in (zr.site[0].alerts if flt is None else flt.alerts(zr.site[0].alerts))
+        if int(a.pluginid) not in exclude_alerts
+    ]
+
+    return zr
+
+
+def _parse_filter(exclude_alerts, flt=None):
+    """Filter to push down into parsing: `flt` (if any) excluding `exclude_alerts` as well."""
+    return (flt or Filter()).excluding(exclude_alerts)
+
+
+def _ingest(
+    f, exclude_alerts=DEFAULT_ALERTS_EXCLUDED, bodies=None, lazy=False, cache=None, drop_fields=(), max_body_size=None,
+    flt=None,
+):
+    kwargs = dict(
+        bodies=bodies, lazy=lazy, drop_fields=drop_fields, max_body_size=max_body_size,
+        flt=_parse_filter(exclude_alerts, flt),
+    )
+    with stage('parse'):
+        if cache is None:
+            zr = ZapReport.from_json_file(f, **kwargs)
+        else:
+            zr = cache.load(f, ZapReport, **kwargs)
+    with stage('preprocess'):
+        return preprocess(zr, exclude_alerts=exclude_alerts, flt=flt)
+
+
+def ingest(
+    in_files, exclude_alerts=DEFAULT_ALERTS_EXCLUDED, jobs=1, bodies=None, lazy=False, cache=None,
+    drop_fields=(), max_body_size=None, flt=None,
+):
+    """Parse and preprocess input files, with up to `jobs` worker processes.
+
+    Named files are handed to workers by name (and closed here),
+    STDIN is read in this process. Order of reports follows `in_files`.
+    The `bodies` store and `lazy` decoding are only used when parsing in this process.
+    Fields named in `drop_fields` are dropped, request/response bodies are truncated
+    to `max_body_size` while parsing, see `ZapReport.from_json_file`.
+    Excluded alerts and findings rejected by `flt` are skipped while parsing already.
+    """
+    if jobs < 2 or len(in_files) < 2:
+        return [_ingest(f, exclude_alerts, bodies, lazy, cache, drop_fields, max_body_size, flt) for f in in_files]
+
+    from concurrent.futures import ProcessPoolExecutor  # Deferred, as quite heavy to import
+    with ProcessPoolExecutor(jobs) as ex:
+        futures = list()
+        for f in in_files:
+            if f is sys.stdin:
+                futures.append(None)
+            else:
+                futures.append(ex.submit(
+                    _ingest, getattr(f, 'name', f), exclude_alerts,
+                    cache=cache, drop_fields=drop_fields, max_body_size=max_body_size, flt=flt,
+                ))
+                if hasattr(f, 'close'):
+                    f.close()
+        return [
+            _ingest(f, exclude_alerts, bodies, lazy, cache, drop_fields, max_body_size, flt)
+            if fut is None else fut.result()
+            for f, fut in zip(in_files, futures)
+        ]
+
+
+def _alert_group_key(a):
+    return (-int(a.riskcode), a.pluginid, a.alert, a.name, a.otherinfo)
+
+
+def _trim_instance(ai):
+    """Clear the request/response of instance, in place."""
+    ai.request_header = ''
+    ai.request_body = ''
+    ai.response_header = ''
+    ai.response_body = ''
+    return ai
+
+
+def _merged_alert(a0, ais, trim=False):
+    """Alert of the group led by `a0`, with given unique instances ordered (and maybe trimmed)."""
+    ais = sorted(
+        ais,
+        # Keep alert instances with non-empty request/response in the end, to be consistent with further clearing
+        key=lambda ai: (ai.has_http_data, ai.fingerprint)
+    )
+    if trim:
+        # Clear the request/response for all but the last one
+        for i in range(len(ais) - 1):
+            _trim_instance(ais[i])
+    return evolve(a0, instances=ais, count=len(ais))
+
+
+def merge(zrs, trim=False, bodies=None):
+    """Merge preprocessed reports, grouping their alerts and deduplicating instances.
+
+    Request/response of instances get interned with `bodies` store, if given,
+    to share them across reports.
+    """
+    zr_merged = evolve(
+        zrs[0],
+        **({'program_name': '(combo)', 'version': ''} if len(zrs) > 1 else {}),
+        site=[evolve(
+            # The first one, unless left empty by `preprocess` for having none
+            next((zr.site[0] for zr in zrs if zr.site[0].name), zrs[0].site[0]),
+            alerts=list(),
+        ),]
+    )
+
+    # Alert group key -> (leading alert, {instance fingerprint: instance})
+    groups = dict()
+    for a in (a for zr in zrs for a in zr.site[0].alerts):
+        if (grp := groups.get(gk := _alert_group_key(a))) is None:
+            grp = groups[gk] = (a, dict())
+        for ai in a.instances:
+            if bodies is not None:
+                bodies.intern_instance(ai)
+            grp[1].setdefault(ai.fingerprint, ai)
+
+    for gk in sorted(groups):
+        a0, ais = groups[gk]
+        zr_merged.site[0].alerts.append(_merged_alert(a0, ais.values(), trim))
+
+    return zr_merged
+
+
+class _Spill:
+    """Temporary file of pickled objects, appendable and re-iterable."""
+
+    def __init__(self, items=()):
+        self._f = tempfile.TemporaryFile()
+        self._n = 0
+        for x in items:
+            self.append(x)
+
+    def append(self, x):
+        self._f.seek(0, os.SEEK_END)
+        pickle.dump(x, self._f, pickle.HIGHEST_PROTOCOL)
+        self._n += 1
+
+    def tell(self):
+        """Position the next object appended is to be at."""
+        return self._f.seek(0, os.SEEK_END)
+
+    def read(self, pos, n):
+        """Yield `n` objects starting from position `pos`."""
+        # Own position kept, so that appends and other iterations may interleave
+        for _ in range(n):
+            self._f.seek(pos)
+            x = pickle.load(self._f)
+            pos = self._f.tell()
+            yield x
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return self.read(0, self._n)
+
+
+class _SpillSegment:
+    """Re-iterable of `n` consecutive objects of a `_Spill`, starting from position `pos`."""
+
+    def __init__(self, spill, pos, n):
+        self._spill, self._pos, self._n = spill, pos, n
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return self._spill.read(self._pos, self._n)
+
+
+def _approx_size(ai):
+    """Rough estimate of memory held by a buffered alert instance record, in bytes."""
+    return 512 + sys.getsizeof(ai) + sum(
+        sys.getsizeof(v) for v in astuple(ai, recurse=False) if isinstance(v, str)
+    )
+
+
+def _unique_instances(records, trim=False):
+    """Instances of a group's records, sorted by key, deduplicated (and maybe trimmed, as `_merged_alert` does)."""
+    prev, prev_fp = None, None
+    for (_gk, _has_http_data, fp), _src, ai in records:
+        if prev is not None:
+            if fp == prev_fp:
+                continue
+            yield _trim_instance(prev) if trim else prev
+        prev, prev_fp = ai, fp
+    if prev is not None:
+        yield prev
+
+
+def merge_external(
+    in_files, exclude_alerts=DEFAULT_ALERTS_EXCLUDED, trim=False, mem_budget=256 << 20,
+    drop_fields=(), max_body_size=None, flt=None,
+):
+    """Out-of-core counterpart of `preprocess` and `merge` for input files.
+
+    Alert instances are read one at a time and buffered up to about `mem_budget` bytes,
+    then spilled as sorted runs to temporary files, to be k-way merged by the group key;
+    only alerts themselves (with no instances) are kept in memory.
+    Merged instances are spilled as well: `instances` of alerts of the result
+    are re-iterables backed by a temporary file.
+    """
+    runs, buf, buf_size = list(), list(), 0
+    zr_heads = list()
+    infos = dict()  # Alert group key -> {(report no, site no): alert with no instances}
+    for i, f in enumerate(in_files):
+        with open_input(f) as fo:
+            zrr = ZapReportReader(
+                fo, drop_fields=drop_fields, max_body_size=max_body_size, flt=_parse_filter(exclude_alerts, flt))
+            for a in zrr:
+                # Sites are tagged to keep the last one only (as `preprocess` does) after all
+                src = (i, len(zrr.report.site))
+                gk = _alert_group_key(a)
+                infos.setdefault(gk, dict()).setdefault(src, evolve(a, instances=[]))
+                for ai in a.instances:
+                    buf.append(((gk, ai.has_http_data, ai.fingerprint), src, ai))
+                    buf_size += _approx_size(ai)
+                    if buf_size > mem_budget:
+                        runs.append(_Spill(sorted(buf, key=itemgetter(0))))
+                        buf, buf_size = list(), 0
+                del a
+        zr_heads.append(zrr.report)
+    runs.append(sorted(buf, key=itemgetter(0)))
+    del buf
+
+    last_sites = {(i, len(zr.site)) for i, zr in enumerate(zr_heads)}
+    # NB: `heapq.merge` yields equal keys in the order of runs, so the merge is stable
+    groups = groupby(
+        (r for r in heapq.merge(*runs, key=itemgetter(0)) if r[1] in last_sites),
+        key=lambda r: r[0][0],
+    )
+    merged_ais = _Spill()
+    alerts = list()
+    gk_next, grp = next(groups, (None, None))
+    for gk in sorted(infos):
+        # The first one read, as `merge` takes
+        if (a0 := next((a for src, a in infos[gk].items() if src in last_sites), None)) is None:
+            continue
+        pos, n = merged_ais.tell(), 0
+        if gk == gk_next:
+            for ai in _unique_instances(grp, trim):
+                merged_ais.append(ai)
+                n += 1
+            gk_next, grp = next(groups, (None, None))
+        alerts.append(evolve(a0, instances=_SpillSegment(merged_ais, pos, n), count=n))
+
+    return evolve(
+        zr_heads[0],
+        **({'program_name': '(combo)', 'version': ''} if len(zr_heads) > 1 else {}),
+        site=[evolve(
+            next((zr.site[-1] for zr in zr_heads if zr.site), None) or _empty_site(),
+            alerts=alerts,
+        ),]
+    )
@@ -0,0 +1,201 @@
+"""Streaming merge of SARIF logs.
+
+Runs are combined by their tool (`tool.driver.name`), with rules combined by id
+and results deduplicated by rule, locations and web request. Inputs are never
+structured as a whole: the first pass keeps runs' "skeletons" only, while results
+are located to be read back and written one by one when the merged log is dumped.
+"""
+
+import json
+import mmap
+import shutil
+import tempfile
+from contextlib import ExitStack
+
+from . import zrjson
+from .zreprt import _digest
+from .zrio import compression, open_input
+from .zrjson import JsonScanner
+
+
+# Run-level tables, referenced by index from results; by referring object's key
+_TABLES = {
+    'artifactLocation': 'artifacts',
+    'webRequest': 'webRequests',
+    'webResponse': 'webResponses',
+}
+
+
+def _seekable(f):
+    """Binary seekable file object of (decompressed) data of `f` (path or file object),
+    spooling compressed and non-seekable ones to a temporary file."""
+    fo = getattr(f, 'buffer', f) if hasattr(f, 'read') else open(f, 'rb')
+    if fo.seekable() and compression(fo) is None:
+        return fo
+    spool = tempfile.TemporaryFile()
+    with open_input(fo) as dfo:
+        shutil.copyfileobj(dfo, spool)
+    spool.seek(0)
+    return spool
+
+
+def _rule_id(result, rules):
+    if rule_id := result.get('ruleId'):
+        return rule_id
+    rule = result.get('rule') or dict()
+    if rule_id := rule.get('id'):
+        return rule_id
+    ix = result.get('ruleIndex', rule.get('index', -1))
+    return rules[ix].get('id') if 0 <= ix < len(rules) else None
+
+
+def _reindexed(obj, offsets):
+    """Shift index references to run-level tables in place, by table offsets."""
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if k in _TABLES and isinstance(v, dict) and isinstance(v.get('index'), int) and v['index'] >= 0:
+                v['index'] += offsets[_TABLES[k]]
+            _reindexed(v, offsets)
+    elif isinstance(obj, list):
+        for v in obj:
+            _reindexed(v, offsets)
+    return obj
+
+
+def _resolved(obj, tables):
+    """Copy of `obj` with index references replaced by what they refer to."""
+    if isinstance(obj, dict):
+        d = dict()
+        for k, v in obj.items():
+            if k in _TABLES and isinstance(v, dict) and 0 <= v.get('index', -1) < len(tables[_TABLES[k]]):
+                ref = tables[_TABLES[k]][v['index']]
+                v = {**(ref.get('location', dict()) if k == 'artifactLocation' else ref), **v}
+                del v['index']
+            d[k] = _resolved(v, tables)
+        return d
+    if isinstance(obj, list):
+        return [_resolved(v, tables) for v in obj]
+    return obj
+
+
+class _RunGroup:
+    """Runs of the same tool, merged."""
+
+    def __init__(self, tool):
+        self.tool = {**tool, 'driver': {**tool['driver'], 'rules': []}}
+        self.rule_ixs = dict()  # Rule id -> index within merged rules
+        self.run = dict()  # Other run-level properties, the first seen
+        self.invocations = list()
+        self.tables = {t: list() for t in _TABLES.values()}
+        self.parts = list()  # Runs' results to read: (file, offset, rules, rule_map, table_offsets)
+
+    def _add_rule(self, rule):
+        rules = self.tool['driver']['rules']
+        if (rule_id := rule.get('id')) is None:
+            rules.append(rule)
+            return len(rules) - 1
+        if rule_id not in self.rule_ixs:
+            self.rule_ixs[rule_id] = len(rules)
+            rules.append(rule)
+        return self.rule_ixs[rule_id]
+
+    def add(self, fo, run, results_at):
+        rules = run['tool']['driver'].get('rules') or list()
+        rule_map = [self._add_rule(r) for r in rules]
+        offsets = dict()
+        for t, rows in self.tables.items():
+            offsets[t] = len(rows)
+            rows.extend(run.pop(t, None) or list())
+        self.invocations.extend(run.pop('invocations', None) or list())
+        for k, v in run.items():
+            if k != 'tool':
+                self.run.setdefault(k, v)
+        if results_at is not None:
+            self.parts.append((fo, results_at, rules, rule_map, offsets))
+
+    def results(self, seen):
+        """Results of all the runs, deduplicated, read back one by one."""
+        for fo, results_at, rules, rule_map, offsets in self.parts:
+            fo.seek(results_at)
+            sc = JsonScanner(fo)
+            for _ in sc.elements():
+                r = sc.value()
+                rule_id = _rule_id(r, rules)
+                if 0 <= (ix := r.get('ruleIndex', -1)) < len(rule_map):
+                    r['ruleIndex'] = rule_map[ix]
+                if 0 <= (ix := (r.get('rule') or dict()).get('index', -1)) < len(rule_map):
+                    r['rule']['index'] = rule_map[ix]
+                _reindexed(r, offsets)
+
+                # Keyed the way results have them, for index references to get resolved
+                located = {'locations': r.get('locations'), 'webRequest': r.get('webRequest')}
+                key = _digest(json.dumps((rule_id, _resolved(located, self.tables)), sort_keys=True).encode())
+                if key not in seen:
+                    seen.add(key)
+                    yield r
+
+    def asdict(self):
+        if not self.tool['driver']['rules']:
+            del self.tool['driver']['rules']
+        return {
+            'tool': self.tool,
+            **self.run,
+            **({'invocations': self.invocations} if self.invocations else {}),
+            **{t: rows for t, rows in self.tables.items() if rows},
+            'results': self.results(set()),
+        }
+
+
+class _SarifMerger:
+    """Merge of SARIF logs read from seekable binary files, see `merge_sarif`."""
+
+    def __init__(self):
+        self.head = dict()  # Top-level properties but runs, the first seen
+        self.groups = dict()  # Tool name -> `_RunGroup`
+
+    def add(self, fo):
+        """Scan SARIF log at `fo`, keeping run-level data and locating results only."""
+        fo.seek(0)
+        try:
+            src = mmap.mmap(fo.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            src = fo  # E.g. spooled in memory, or empty
+        sc = JsonScanner(src)
+        for key in sc.items():
+            if key != 'runs':
+                self.head.setdefault(key, sc.value())
+                continue
+            for _ in sc.elements():
+                run, results_at = dict(), None
+                for k in sc.items():
+                    if k == 'results' and sc.peek() == b'[':
+                        results_at = sc.offset + sc.pos
+                        for _ in sc.elements():
+                            sc.span()
+                    else:
+                        run[k] = sc.value()
+                tool = run.setdefault('tool', dict())
+                name = tool.setdefault('driver', dict()).get('name')
+                if name not in self.groups:
+                    self.groups[name] = _RunGroup(tool)
+                self.groups[name].add(fo, run, results_at)
+        if isinstance(src, mmap.mmap):
+            src.close()
+
+    def dump(self, fo):
+        """Write the merged log to text file `fo`, result by result."""
+        zrjson.dump({**self.head, 'runs': [g.asdict() for g in self.groups.values()]}, fo)
+
+
+def merge_sarif(in_files, fo):
+    """Merge SARIF logs from `in_files` (paths or file objects), writing the result to `fo`.
+
+    Runs of the same tool are merged into one; rules are combined by id
+    (references by index remapped), duplicate results are dropped.
+    Compressed and non-seekable inputs (e.g. STDIN) are spooled to temporary files.
+    """
+    with ExitStack() as stack:
+        merger = _SarifMerger()
+        for f in in_files:
+            merger.add(stack.enter_context(_seekable(f)))
+        merger.dump(fo)
@@ -0,0 +1,223 @@
+"""Resident conversion service: `zreprt serve`.
+
+Minimal HTTP/1.1 over a Unix socket or localhost TCP, built on asyncio:
+
+    POST /convert?format={zap|zap-orig|sarif}[&keep_data_full=1][&exclude=10109,...]
+
+with a ZAP(-like) report, or a JSON array of them to be merged, as the request body
+(`Content-Length` required); the converted report is streamed back.
+`GET /health` answers "ok".
+
+Request and response bodies are spooled to temporary files, while parsing,
+merging and conversion run on a bounded pool of worker processes,
+which keep their converters (and the SARIF model) warm between requests.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from urllib.parse import parse_qs, urlsplit
+
+from cattrs import BaseValidationError
+
+from .zreprt import BodyStore, ZapReportReader
+from .zrfilter import Filter
+from .zrjson import JsonScanner
+from .zrmerge import DEFAULT_ALERTS_EXCLUDED, merge, preprocess
+
+
+_CHUNK_SIZE = 1 << 16
+_FORMATS = ('zap', 'zap-orig', 'sarif')
+_EMPTY_REPORT = b'{"site": [{"name": "", "host": "", "port": "", "ssl": false, "alerts": []}]}'
+
+
+def _warm_up():
+    """Worker initializer: import and generate everything needed for conversions upfront."""
+    import io
+    from . import zr2sarif
+    zr = ZapReportReader(io.BytesIO(_EMPTY_REPORT)).read()
+    zr.dump_json(io.StringIO())
+    zr.dump_json_orig(io.StringIO())
+    zr2sarif.transmodel_dump(zr, io.StringIO())
+
+
+def _convert(in_path, out_path, fmt='zap', trim=True, exclude_alerts=DEFAULT_ALERTS_EXCLUDED):
+    """Convert (merging, if array of) report(s) at `in_path`, writing the result to `out_path`."""
+    bodies = BodyStore()
+    flt = Filter(exclude_plugins=exclude_alerts)  # Excluded alerts are skipped while parsing
+    with open(in_path, 'rb') as fo:
+        sc = JsonScanner(fo)
+        if sc.peek() == b'[':
+            zrs = [ZapReportReader(sc, bodies=bodies, flt=flt).read() for _ in sc.elements()]
+        else:
+            zrs = [ZapReportReader(sc, bodies=bodies, flt=flt).read()]
+        sc.end()
+    if not zrs:
+        raise ValueError('No reports given')
+    zr_merged = merge([preprocess(zr, exclude_alerts=exclude_alerts) for zr in zrs], trim=trim, bodies=bodies)
+    del zrs, bodies
+
+    with open(out_path, 'w', encoding='utf-8') as fo:
+        if fmt == 'sarif':
+            from .zr2sarif import transmodel_dump
+            transmodel_dump(zr_merged, fo)
+        elif fmt == 'zap-orig':
+            zr_merged.dump_json_orig(fo)
+        else:
+            zr_merged.dump_json(fo)
+
+
+class _HttpError(Exception):
+    def __init__(self, status, reason, msg=''):
+        super().__init__(msg or reason)
+        self.status, self.reason = status, reason
+
+
+class ConversionService:
+    """Serves conversion requests on a pool of `jobs` worker processes,
+    with up to `2 * jobs` requests in progress at once."""
+
+    def __init__(self, jobs=None):
+        self.jobs = jobs or os.cpu_count() or 1
+        # Not forked off this process: workers would keep connections open (those accepted by then)
+        mp_context = multiprocessing.get_context('forkserver') if os.name == 'posix' else None
+        self._pool = ProcessPoolExecutor(self.jobs, mp_context=mp_context, initializer=_warm_up)
+        self._slots = asyncio.Semaphore(2 * self.jobs)
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        try:
+            await self._handle(reader, writer)
+        except _HttpError as e:
+            await self._respond(writer, e.status, e.reason, str(e).encode() + b'\n', 'text/plain')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            method, target, _version = (await reader.readline()).decode('latin-1').split()
+        except ValueError:
+            raise _HttpError(400, 'Bad Request', 'Malformed request line')
+        headers = dict()
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        url = urlsplit(target)
+        if url.path == '/health' and method == 'GET':
+            return await self._respond(writer, 200, 'OK', b'ok\n', 'text/plain')
+        if url.path != '/convert':
+            raise _HttpError(404, 'Not Found')
+        if method != 'POST':
+            raise _HttpError(405, 'Method Not Allowed')
+        if not (length := headers.get('content-length', '')).isdigit():
+            raise _HttpError(411, 'Length Required')
+
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if (fmt := query.get('format', 'zap')) not in _FORMATS:
+            raise _HttpError(400, 'Bad Request', f'Unknown format, expecting one of {_FORMATS}')
+        exclude_alerts = DEFAULT_ALERTS_EXCLUDED
+        if 'exclude' in query:
+            try:
+                exclude_alerts = [int(x) for x in query['exclude'].split(',') if x]
+            except ValueError:
+                raise _HttpError(400, 'Bad Request', 'Plugin ids to exclude should be integers')
+        trim = query.get('keep_data_full', '0') in ('', '0', 'false')
+
+        async with self._slots:
+            with tempfile.TemporaryDirectory(prefix='zreprt-') as tmp_dir:
+                in_path, out_path = os.path.join(tmp_dir, 'in.json'), os.path.join(tmp_dir, 'out.json')
+                with open(in_path, 'wb') as fo:
+                    left = int(length)
+                    while left:
+                        chunk = await reader.read(min(left, _CHUNK_SIZE))
+                        if not chunk:
+                            raise asyncio.IncompleteReadError(b'', left)
+                        fo.write(chunk)
+                        left -= len(chunk)
+                try:
+                    await asyncio.get_running_loop().run_in_executor(
+                        self._pool, _convert, in_path, out_path, fmt, trim, exclude_alerts)
+                except (BaseValidationError, ValueError, TypeError, KeyError) as e:
+                    raise _HttpError(400, 'Bad Request', f'{type(e).__name__}: {e}')
+                except Exception as e:
+                    raise _HttpError(500, 'Internal Server Error', f'{type(e).__name__}: {e}')
+
+                with open(out_path, 'rb') as fo:
+                    await self._respond(writer, 200, 'OK', fo, 'application/json', os.path.getsize(out_path))
+
+    async def _respond(self, writer, status, reason, body, content_type, length=None):
+        writer.write((
+            f'HTTP/1.1 {status} {reason}\r\n'
+            f'Content-Type: {content_type}; charset=utf-8\r\n'
+            f'Content-Length: {len(body) if length is None else length}\r\n'
+            'Connection: close\r\n'
+            '\r\n'
+        ).encode('latin-1'))
+        if isinstance(body, bytes):
+            writer.write(body)
+        else:
+            while chunk := body.read(_CHUNK_SIZE):
+                writer.write(chunk)
+                await writer.drain()
+        await writer.drain()
+
+
+async def serve(unix_path=None, host='127.0.0.1', port=8088, jobs=None):
+    service = ConversionService(jobs)
+    try:
+        if unix_path:
+            server = await asyncio.start_unix_server(service.handle, path=unix_path)
+        else:
+            server = await asyncio.start_server(service.handle, host=host, port=port)
+        where = ', '.join(map(str, (s.getsockname() for s in server.sockets)))
+        print(f'zreprt: serving on {where} with {service.jobs} worker(s)', file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog=f'{__package__} serve',
+        description='Run resident conversion service.',
+    )
+    parser_listen_args = parser.add_mutually_exclusive_group(required=False)
+    parser_listen_args.add_argument(
+        '--unix',
+        metavar='PATH',
+        help='Listen on Unix socket at PATH.'
+    )
+    parser_listen_args.add_argument(
+        '--port',
+        type=int,
+        default=8088,
+        help='Listen on localhost TCP port. Defaults to %(default)s.'
+    )
+    parser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='Host/address to listen on with TCP. Defaults to %(default)s.'
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        help='Number of worker processes. Defaults to the number of CPUs.'
+    )
+    args = parser.parse_args(argv)
+
+    with suppress(KeyboardInterrupt):
+        asyncio.run(serve(unix_path=args.unix, host=args.host, port=args.port, jobs=args.jobs))
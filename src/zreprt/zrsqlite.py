@@ -0,0 +1,170 @@
+"""Export of (merged) reports into a normalized SQLite database, for querying findings.
+
+Distinct request/response headers and bodies are stored once, in `bodies`,
+and referred to by instances. Alerts are indexed by risk, plugin and CWE,
+instances by URI and parameter; the `findings` view joins them all, e.g.:
+
+    SELECT uri, param FROM findings WHERE riskcode = 3 AND uri LIKE '%/api/%' AND param = 'id'
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from .zreprt import _digest
+
+
+_SCHEMA = '''
+CREATE TABLE report (
+    program_name TEXT,
+    version TEXT,
+    generated_ts TEXT
+);
+CREATE TABLE sites (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    host TEXT,
+    port TEXT,
+    ssl INTEGER
+);
+CREATE TABLE alerts (
+    id INTEGER PRIMARY KEY,
+    site_id INTEGER NOT NULL REFERENCES sites (id),
+    pluginid INTEGER,
+    alertref TEXT,
+    alert TEXT,
+    name TEXT,
+    riskcode INTEGER,
+    confidence INTEGER,
+    riskdesc TEXT,
+    description TEXT,
+    solution TEXT,
+    otherinfo TEXT,
+    reference TEXT,
+    cweid INTEGER,
+    wascid INTEGER,
+    sourceid INTEGER,
+    count INTEGER,
+    tags TEXT  -- JSON
+);
+CREATE TABLE bodies (
+    id INTEGER PRIMARY KEY,
+    content TEXT NOT NULL
+);
+CREATE TABLE instances (
+    id INTEGER PRIMARY KEY,
+    alert_id INTEGER NOT NULL REFERENCES alerts (id),
+    uri TEXT,
+    method TEXT,
+    param TEXT,
+    attack TEXT,
+    evidence TEXT,
+    otherinfo TEXT,
+    request_header_id INTEGER REFERENCES bodies (id),
+    request_body_id INTEGER REFERENCES bodies (id),
+    response_header_id INTEGER REFERENCES bodies (id),
+    response_body_id INTEGER REFERENCES bodies (id)
+);
+CREATE VIEW findings AS
+SELECT
+    i.id, i.alert_id, a.site_id, s.name AS site,
+    a.pluginid, a.alert, a.riskcode, a.confidence, a.cweid, a.wascid,
+    i.uri, i.method, i.param, i.attack, i.evidence, i.otherinfo,
+    rqh.content AS request_header, rqb.content AS request_body,
+    rsh.content AS response_header, rsb.content AS response_body
+FROM instances i
+JOIN alerts a ON a.id = i.alert_id
+JOIN sites s ON s.id = a.site_id
+LEFT JOIN bodies rqh ON rqh.id = i.request_header_id
+LEFT JOIN bodies rqb ON rqb.id = i.request_body_id
+LEFT JOIN bodies rsh ON rsh.id = i.response_header_id
+LEFT JOIN bodies rsb ON rsb.id = i.response_body_id;
+'''
+
+# Created after the data is inserted, which is faster than maintaining them on insert
+_INDEXES = (
+    'CREATE INDEX alerts_riskcode ON alerts (riskcode)',
+    'CREATE INDEX alerts_pluginid ON alerts (pluginid)',
+    'CREATE INDEX alerts_cweid ON alerts (cweid)',
+    'CREATE INDEX instances_alert_id ON instances (alert_id)',
+    'CREATE INDEX instances_uri ON instances (uri)',
+    'CREATE INDEX instances_param ON instances (param)',
+)
+
+
+class _Bodies:
+    """Ids of distinct non-empty request/response data, with rows of those not inserted yet.
+
+    Known data is kept by digest, not to hold it all in memory for reports that do not.
+    """
+
+    def __init__(self):
+        self._ids = dict()  # digest -> id
+        self.rows = list()
+
+    def id(self, content):
+        if not content:
+            return None
+        if (i := self._ids.get(d := _digest(content.encode()))) is None:
+            i = self._ids[d] = len(self._ids) + 1
+            self.rows.append((i, content))
+        return i
+
+
+def _instance_rows(alert_id, instances, bodies):
+    for ai in instances:
+        yield (
+            alert_id, ai.uri, ai.method, ai.param, ai.attack, ai.evidence, ai.otherinfo,
+            bodies.id(ai.request_header), bodies.id(ai.request_body),
+            bodies.id(ai.response_header), bodies.id(ai.response_body),
+        )
+
+
+def export_sqlite(zr, path):
+    """Write report `zr` (e.g. `merge` output) into a new SQLite database at `path`, replacing any file there.
+
+    Everything is inserted in a single transaction, into a temporary file
+    renamed to `path` once complete; alerts are iterated once.
+    """
+    path = Path(path)
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}', suffix='.tmp', delete=False) as fo:
+        tmp_path = fo.name
+    try:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute('PRAGMA journal_mode = OFF')  # A new file, discarded on failure anyway
+            conn.executescript(_SCHEMA)
+            bodies = _Bodies()
+            alert_id = 0
+            with conn:
+                conn.execute('INSERT INTO report VALUES (?, ?, ?)', (
+                    zr.program_name, zr.version, zr.generated_ts.isoformat() if zr.generated_ts else None,
+                ))
+                for site_id, site in enumerate(zr.site, 1):
+                    conn.execute('INSERT INTO sites VALUES (?, ?, ?, ?, ?)', (
+                        site_id, site.name, site.host, site.port, site.ssl,
+                    ))
+                    for a in site.alerts:
+                        alert_id += 1
+                        conn.execute(f'INSERT INTO alerts VALUES ({", ".join("?" * 18)})', (
+                            alert_id, site_id, a.pluginid, a.alertref, a.alert, a.name,
+                            a.riskcode, a.confidence, a.riskdesc,
+                            a.description, a.solution, a.otherinfo, a.reference,
+                            a.cweid, a.wascid, a.sourceid, a.count, json.dumps(a.tags),
+                        ))
+                        conn.executemany(
+                            'INSERT INTO instances VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            _instance_rows(alert_id, a.instances, bodies),
+                        )
+                        conn.executemany('INSERT INTO bodies VALUES (?, ?)', bodies.rows)
+                        bodies.rows.clear()
+                for stmt in _INDEXES:
+                    conn.execute(stmt)
+        finally:
+            conn.close()
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    os.replace(tmp_path, path)
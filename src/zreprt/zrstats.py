@@ -0,0 +1,103 @@
+"""Per-stage profiling: wall and CPU time, object counts, peak memory.
+
+Stages are timed within `collecting_stats()` only; elsewhere `stage()`
+and `timed()` cost a context variable lookup. Top-level stages also
+record the number of objects tracked by GC at their end, and, when
+`tracemalloc` is tracing, the peak of memory allocated during them.
+Nested stages (e.g. HTTP parsing during SARIF conversion)
+accumulate their time and number of calls only.
+"""
+
+import gc
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+
+
+def _cpu_time():
+    """CPU time of this process and its waited-for children, e.g. worker processes."""
+    t = os.times()
+    return time.process_time() + t.children_user + t.children_system
+
+
+class Stats:
+    """Stats collected by stage name, in order of the stages entered."""
+
+    def __init__(self):
+        self.stages = dict()
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name, nested=False):
+        st = self.stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+        top = not (nested or self._depth)
+        if top and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._depth += 1
+        w0, c0 = time.perf_counter(), _cpu_time()
+        try:
+            yield st
+        finally:
+            st['wall_s'] += time.perf_counter() - w0
+            st['cpu_s'] += _cpu_time() - c0
+            st['calls'] += 1
+            self._depth -= 1
+            if top:
+                st['objects'] = len(gc.get_objects())
+                if tracemalloc.is_tracing():
+                    st['peak_mb'] = max(st.get('peak_mb', 0), tracemalloc.get_traced_memory()[1] / (1 << 20))
+
+    def asdict(self):
+        """Stats of the stages completed at least once."""
+        return {
+            name: {k: round(v, 4) if isinstance(v, float) else v for k, v in st.items()}
+            for name, st in self.stages.items()
+            if st['calls']
+        }
+
+
+# Stats collector of the current thread (or task)
+_stats = ContextVar('zreprt_stats', default=None)
+
+
+@contextmanager
+def collecting_stats(memory=False):
+    """Collect stats of stages within the block, tracing memory allocations if `memory`
+    (which slows things down noticeably)."""
+    token = _stats.set(collector := Stats())
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    else:
+        memory = False
+    try:
+        yield collector
+    finally:
+        if memory:
+            tracemalloc.stop()
+        _stats.reset(token)
+
+
+def current_stats():
+    """Stats being collected, if any."""
+    return _stats.get()
+
+
+def stage(name):
+    """Context manager timing the block as stage `name`, when stats are collected."""
+    return nullcontext() if (collector := _stats.get()) is None else collector.stage(name)
+
+
+def timed(name):
+    """Decorator timing each call as (nested) stage `name`, when stats are collected."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if (collector := _stats.get()) is None:
+                return fn(*args, **kwargs)
+            with collector.stage(name, nested=True):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
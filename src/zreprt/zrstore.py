@@ -0,0 +1,194 @@
+"""Persistent findings store, to merge reports incrementally.
+
+Alerts are kept grouped by the same key as `merge` groups them by,
+instances are deduplicated by their fingerprint. Ingesting a report
+costs work proportional to that report, while the merged report
+is produced straight from the store, alert by alert.
+
+Sources of reports ingested (e.g. file path, size and mtime) are recorded,
+so that the same report is not counted twice, and so are the options
+reports were parsed with, so that reports parsed otherwise are not mixed in.
+"""
+
+import json
+import os
+import sqlite3
+
+from attrs import evolve
+
+from .zreprt import ZapAlertInfo, ZapAlertInstance, ZapReport, ZapSite, _digest, _zlike_conv
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    key TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    neg_riskcode INTEGER NOT NULL,
+    pluginid INTEGER NOT NULL,
+    alert TEXT,
+    name TEXT,
+    otherinfo TEXT,
+    info TEXT NOT NULL,  -- ZAP-like JSON, no instances
+    UNIQUE (neg_riskcode, pluginid, alert, name, otherinfo)
+);
+CREATE TABLE IF NOT EXISTS instances (
+    alert_id INTEGER NOT NULL REFERENCES alerts (id),
+    fingerprint BLOB NOT NULL,
+    has_http_data INTEGER NOT NULL,
+    uri TEXT,
+    method TEXT,
+    param TEXT,
+    attack TEXT,
+    evidence TEXT,
+    otherinfo TEXT,
+    http_digests BLOB NOT NULL,
+    request_header TEXT,
+    request_body TEXT,
+    response_header TEXT,
+    response_body TEXT,
+    PRIMARY KEY (alert_id, fingerprint)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS instances_fingerprint ON instances (fingerprint);
+'''
+
+# Same order as `merge` gives: by group key, then by (has_http_data, fingerprint)
+_ALERTS_Q = 'SELECT id, info FROM alerts ORDER BY neg_riskcode, pluginid, alert, name, otherinfo'
+_INSTANCES_Q = '''
+SELECT uri, method, param, attack, evidence, otherinfo,
+    request_header, request_body, response_header, response_body
+FROM instances WHERE alert_id = ?
+ORDER BY has_http_data, uri, method, param, attack, evidence, otherinfo, http_digests
+'''
+
+
+def _instance_row(alert_id, ai):
+    fp = ai.fingerprint
+    # Flagged, to keep the order of fingerprint digests, where b'' is for None
+    http_digests = b''.join(b'\x01' + d if d else b'\x00' * 17 for d in fp[6:])
+    return (
+        alert_id,
+        _digest(json.dumps(fp[:6]).encode() + http_digests),
+        ai.has_http_data,
+        *fp[:6],
+        http_digests,
+        ai.request_header, ai.request_body, ai.response_header, ai.response_body,
+    )
+
+
+def source_key(path):
+    """Key of report file at `path` as a source: its real path, size and mtime."""
+    st = os.stat(path)
+    return f'{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}'
+
+
+class FindingsStore:
+    """SQLite-backed store of (preprocessed) reports' findings.
+
+    With `options` (JSON-serializable) the reports are parsed with given, the store
+    only accepts reports parsed with the same options as those stored before:
+    ValueError is raised otherwise. Use it as a context manager, or `close()` it.
+    """
+
+    def __init__(self, path, options=None):
+        self._conn = sqlite3.connect(path)
+        try:
+            self._conn.executescript(_SCHEMA)
+            self._options = json.loads(json.dumps(options))  # As stored
+            if options is not None and (stored := self._meta('options')) is not None and stored != self._options:
+                raise ValueError(f'Store {path} holds reports parsed with other options: {stored}')
+        except BaseException:
+            self._conn.close()
+            raise
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _meta(self, key):
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def has(self, source):
+        """Whether report of `source` (see `source_key`) has been ingested."""
+        return self._conn.execute('SELECT 1 FROM sources WHERE key = ?', (source,)).fetchone() is not None
+
+    def add(self, zr, source=None):
+        """Ingest the first site of preprocessed report, in a single transaction.
+
+        Report of a `source` (see `source_key`) ingested before is skipped; return whether ingested.
+        """
+        site = zr.site[0]
+        with self._conn as conn:
+            if source is not None:
+                if self.has(source):
+                    return False
+                conn.execute('INSERT INTO sources VALUES (?)', (source,))
+            if (n := self._meta('reports')) is None:
+                conn.executemany('INSERT INTO meta VALUES (?, ?)', (
+                    ('report', json.dumps(_zlike_conv.unstructure(evolve(zr, site=[])))),
+                    ('site', json.dumps(_zlike_conv.unstructure(evolve(site, alerts=[])))),
+                ))
+            if self._options is not None:
+                conn.execute('INSERT OR IGNORE INTO meta VALUES (?, ?)', ('options', json.dumps(self._options)))
+            conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('reports', json.dumps((n or 0) + 1)))
+            for a in site.alerts:
+                gk = (-int(a.riskcode), a.pluginid, a.alert, a.name, a.otherinfo)
+                conn.execute(
+                    'INSERT OR IGNORE INTO alerts VALUES (NULL, ?, ?, ?, ?, ?, ?)',
+                    (*gk, json.dumps(_zlike_conv.unstructure(evolve(a, instances=[])))),
+                )
+                (alert_id,), = conn.execute(
+                    'SELECT id FROM alerts'
+                    ' WHERE neg_riskcode = ? AND pluginid = ? AND alert = ? AND name = ? AND otherinfo = ?',
+                    gk,
+                )
+                conn.executemany(
+                    'INSERT OR IGNORE INTO instances VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (_instance_row(alert_id, ai) for ai in a.instances),
+                )
+        return True
+
+    def report(self, trim=False):
+        """Report merged from everything stored, the same as `merge` would give.
+
+        Alerts of its only site are read from the store on each iteration.
+        """
+        if (n := self._meta('reports')) is None:
+            return ZapReport()
+        return evolve(
+            _zlike_conv.structure({**self._meta('report'), 'site': []}, ZapReport),
+            **({'program_name': '(combo)', 'version': ''} if n > 1 else {}),
+            site=[evolve(
+                _zlike_conv.structure({**self._meta('site'), 'alerts': []}, ZapSite),
+                alerts=_StoredAlerts(self._conn, trim),
+            ),]
+        )
+
+
+class _StoredAlerts:
+    """Re-iterable over merged alerts of the store."""
+
+    def __init__(self, conn, trim):
+        self._conn = conn
+        self._trim = trim
+
+    def __iter__(self):
+        for alert_id, info in self._conn.execute(_ALERTS_Q):
+            rows = self._conn.execute(_INSTANCES_Q, (alert_id,)).fetchall()
+            ais = [
+                ZapAlertInstance(*row[:6], *(('',) * 4 if self._trim and i < len(rows) - 1 else row[6:]))
+                for i, row in enumerate(rows)
+            ]
+            a0 = _zlike_conv.structure({**json.loads(info), 'instances': []}, ZapAlertInfo)
+            yield evolve(a0, instances=ais, count=len(ais))
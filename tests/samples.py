@@ -0,0 +1,64 @@
+"""Sample ZAP reports (as dicts, in original naming) for tests."""
+
+import json
+
+
+def instance(n, body='', uri=None, request_header=None):
+    if request_header is None:
+        request_header = f'GET /{n} HTTP/1.1\r\nHost: example.com\r\n\r\n'
+    return {
+        'uri': uri or f'https://example.com/{n}', 'method': 'GET', 'param': '', 'attack': '', 'evidence': '',
+        'otherinfo': '', 'request-header': request_header, 'request-body': '',
+        'response-header': 'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n' if body else '',
+        'response-body': body,
+    }
+
+
+def alert(pluginid, riskcode, instances, confidence=2):
+    return {
+        'pluginid': str(pluginid), 'alertRef': str(pluginid), 'alert': f'Alert {pluginid}', 'name': f'Alert {pluginid}',
+        'riskcode': str(riskcode), 'confidence': str(confidence), 'riskdesc': '', 'desc': f'<p>Alert {pluginid}</p>',
+        'instances': instances, 'count': str(len(instances)), 'solution': '', 'otherinfo': '', 'reference': '',
+        'cweid': '-1', 'wascid': '-1', 'sourceid': '1',
+    }
+
+
+def report(sites):
+    """Report of (name, alerts) `sites`."""
+    return {
+        '@programName': 'ZAP', '@version': '2.14.0', '@generated': 'Mon, 1 Jan 2024 00:00:00',
+        'site': [
+            {'@name': name, '@host': name.partition('://')[2], '@port': '443', '@ssl': 'true', 'alerts': alerts}
+            for name, alerts in sites
+        ],
+    }
+
+
+def reports():
+    """Two reports to merge: the first one of two sites, alerts of both overlapping."""
+    return [
+        report([
+            ('https://old.example.com', [alert(1, 3, [instance(n) for n in range(5)])]),
+            ('https://example.com', [
+                alert(1, 3, [instance(n, 'body' * (n % 2)) for n in range(40)]),
+                alert(2, 1, [instance(n) for n in range(10)], confidence=3),
+                alert(3, 0, []),
+            ]),
+        ]),
+        report([
+            ('https://example.com', [
+                alert(2, 1, [instance(n) for n in range(5, 30)], confidence=3),
+                alert(1, 3, [instance(n, 'body' * (n % 2)) for n in range(20, 60)]),
+                alert(4, 2, [instance(n, 'Ünïcode\n"quoted"\\') for n in range(3)], confidence=1),
+            ]),
+        ]),
+    ]
+
+
+def write_reports(dir_path, docs=None):
+    """Write `docs` (`reports()`, by default) as JSON files to `dir_path`, returning their paths."""
+    paths = list()
+    for i, d in enumerate(reports() if docs is None else docs):
+        paths.append(path := dir_path / f'zap-{i}.json')
+        path.write_text(json.dumps(d, indent=1))
+    return [str(p) for p in paths]
@@ -0,0 +1,107 @@
+import hashlib
+import io
+import json
+
+from zreprt import ZapReport
+from zreprt.zr2sarif import _split_header_block_cached, _web_request, _web_response, transmodel, transmodel_dump
+from zreprt.zrsarif import _TABLES, _resolved
+
+from samples import alert, instance, report
+
+
+def test_parsed_headers_not_shared():
+    zhdr = 'GET / HTTP/1.1\r\nHost: example.com\r\nbogus\r\n'
+    r1, r2 = _web_request(zhdr, ''), _web_request(zhdr, '')
+    r1.headers.append(['X-Added', ' 1'])
+    r1.headers[0][1] = ' example.org'
+    r1.properties['raw_data']['headers'][0].append('')
+    assert r2.headers == [['Host', ' example.com']]
+    assert r2.properties['raw_data']['headers'] == [['bogus']]
+
+    rhdr = 'HTTP/1.1 200 OK\r\nServer: x\r\n'
+    s1, s2 = _web_response(rhdr, ''), _web_response(rhdr, '')
+    s1.headers.clear()
+    assert s2.headers == [['Server', ' x']]
+
+
+def test_header_cache_bounded():
+    _split_header_block_cached.cache_clear()
+    long_hdr = f'GET / HTTP/1.1\r\nCookie: {"c" * 5000}\r\n'
+    assert _web_request(long_hdr, '').headers == [['Cookie', f' {"c" * 5000}']]
+    assert _split_header_block_cached.cache_info().currsize == 0  # Too long to keep
+    _web_request('GET / HTTP/1.1\r\n', '')
+    assert _split_header_block_cached.cache_info().currsize == 1
+
+    # Released once converted
+    zr = ZapReport.from_dict(report([('https://example.com', [alert(1, 1, [instance(n) for n in range(3)])])]))
+    transmodel(zr)
+    assert _split_header_block_cached.cache_info().currsize == 0
+    transmodel_dump(zr, io.StringIO())
+    assert _split_header_block_cached.cache_info().currsize == 0
+
+
+def _sarif_results(zr, **kwargs):
+    fo = io.StringIO()
+    transmodel_dump(zr, fo, **kwargs)
+    run = json.loads(fo.getvalue())['runs'][0]
+    return run['results'], run['conversion']['invocation']['toolExecutionNotifications']
+
+
+def test_max_body_size():
+    hdr = f'GET https://example.com/?id={"1" * 100} HTTP/1.1\r\nHost: example.com\r\nCookie: {"c" * 100}\r\n\r\n'
+    body = 'Ünïcode ' * 20
+    d = report([('https://example.com', [alert(1, 1, [instance(0, body, request_header=hdr)])])])
+    truncated = {'response_body': {'length': len(body), 'sha256': hashlib.sha256(body.encode()).hexdigest()}}
+
+    # Truncated while converting, or while parsing already
+    for zr, kwargs in (
+        (ZapReport.from_dict(d), {'max_body_size': 10}),
+        (ZapReport.from_dict(d, max_body_size=10), {}),
+    ):
+        (r,), notifications = _sarif_results(zr, **kwargs)
+        assert not notifications
+        # Headers are kept whole, thus parsed
+        assert r['webRequest']['target'] == f'https://example.com/?id={"1" * 100}'
+        assert r['webRequest']['version'] == '1.1'
+        assert r['webRequest']['headers'][-1] == ['Cookie', f' {"c" * 100}']
+        assert r['webResponse']['body']['properties']['response_body'] == body[:10]
+        assert r['webResponse']['properties']['truncated'] == truncated
+        assert 'properties' not in r['webRequest']
+
+
+def test_tables_same_as_inline():
+    instances = [
+        *(instance(n, 'body', request_header='bogus start line\r\nHost: example.com\r\n\r\n') for n in range(50)),
+        *(instance(n, 'body' * n) for n in range(50, 60)),
+    ]
+    zr = ZapReport.from_dict(report([('https://example.com', [alert(1, 1, instances), alert(2, 2, instances[:5])])]))
+    logs = dict()
+    for tables in (False, True):
+        fo = io.StringIO()
+        transmodel_dump(zr, fo, tables=tables)
+        logs[tables] = json.loads(fo.getvalue())['runs'][0]
+    inline, tabled = logs[False], logs[True]
+
+    assert len(tabled['webRequests']) == 11
+    assert _resolved(tabled['results'], {t: tabled.get(t, []) for t in _TABLES.values()}) == inline['results']
+    notifications = inline['conversion']['invocation']['toolExecutionNotifications']
+    assert tabled['conversion']['invocation']['toolExecutionNotifications'] == notifications
+    assert '(x55)' in next(n['message']['text'] for n in notifications if 'protocol/version' in n['message']['text'])
+
+
+def test_rule_index():
+    # Rule 1 of two alerts (differing in risk), rule 3 of none
+    zr = ZapReport.from_dict(report([('https://example.com', [
+        alert(2, 1, [instance(0)]),
+        alert(1, 3, [instance(1), instance(2)]),
+        alert(3, 0, []),
+        alert(1, 1, [instance(3)]),
+    ])]))
+    for tables in (False, True):
+        fo = io.StringIO()
+        transmodel_dump(zr, fo, tables=tables)
+        for run in (json.loads(fo.getvalue())['runs'][0], json.loads(transmodel(zr, tables=tables).json())['runs'][0]):
+            rules = run['tool']['driver']['rules']
+            assert [r['id'] for r in rules] == ['2', '1', '3']
+            assert [r['ruleId'] for r in run['results']] == ['2', '1', '1', '1']
+            assert all(rules[r['ruleIndex']]['id'] == r['ruleId'] for r in run['results'])
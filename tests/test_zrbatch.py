@@ -0,0 +1,87 @@
+import io
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+from zreprt.__main__ import main
+from zreprt.zrbatch import MANIFEST_NAME, output_path, report_groups
+from zreprt.zrmerge import ingest, merge
+
+from samples import reports, write_reports
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('zap-0.json', 'zap-0-m.json'),
+    ('zap-0.json.gz', 'zap-0-m.json.gz'),
+    ('zap-0.json.XZ', 'zap-0-m.json.XZ'),
+    ('zap-0', 'zap-0-m'),
+])
+def test_output_path(name, expected):
+    assert output_path(Path('d') / name) == Path('d') / expected
+
+
+def test_report_groups_skip_outputs(tmp_path):
+    for name in ('zap-0.json.gz', 'zap-0-m.json.gz', 'zap-1.json', 'zap-1-m.json', 'notes.txt'):
+        (tmp_path / name).touch()
+    assert list(report_groups(tmp_path)) == [(tmp_path, [tmp_path / 'zap-0.json.gz', tmp_path / 'zap-1.json'])]
+
+
+def _batch(monkeypatch, capsys, root, *args):
+    """Summary line of `zreprt --batch root *args` run, and its exit status."""
+    monkeypatch.setattr(sys, 'argv', ['zreprt', '--batch', str(root), *args])
+    status = main()
+    return capsys.readouterr().err.splitlines()[-1], status
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_batch_skips_unchanged(tmp_path, monkeypatch, capsys, jobs):
+    (a := tmp_path / 'a').mkdir()
+    (b := tmp_path / 'b').mkdir()
+    paths_a, paths_b = write_reports(a), write_reports(b, reports()[1:])
+    assert _batch(monkeypatch, capsys, tmp_path, '-j', jobs) == ('2 converted, 0 unchanged, 0 failed', None)
+    expected = io.StringIO()
+    merge(ingest(paths_a), trim=True).dump_json(expected)
+    assert (a / 'zap-0-m.json').read_text() == expected.getvalue()
+    assert (b / 'zap-0-m.json').is_file()
+    assert set(json.loads((tmp_path / MANIFEST_NAME).read_text())['groups']) == {'a/zap-0-m.json', 'b/zap-0-m.json'}
+
+    assert _batch(monkeypatch, capsys, tmp_path, '-j', jobs) == ('0 converted, 2 unchanged, 0 failed', None)
+    (b / 'zap-0-m.json').unlink()  # Output gone
+    assert _batch(monkeypatch, capsys, tmp_path, '-j', jobs) == ('1 converted, 1 unchanged, 0 failed', None)
+
+
+def test_batch_redoes_changed(tmp_path, monkeypatch, capsys):
+    (a := tmp_path / 'a').mkdir()
+    (b := tmp_path / 'b').mkdir()
+    write_reports(a)
+    paths_b = write_reports(b)
+    assert _batch(monkeypatch, capsys, tmp_path)[0] == '2 converted, 0 unchanged, 0 failed'
+
+    # Input changed in content, not in name
+    write_reports(b, reports()[::-1])
+    assert _batch(monkeypatch, capsys, tmp_path)[0] == '1 converted, 1 unchanged, 0 failed'
+    expected = io.StringIO()
+    merge(ingest(paths_b), trim=True).dump_json(expected)
+    assert (b / 'zap-0-m.json').read_text() == expected.getvalue()
+
+    # Input added
+    write_reports(a, [*reports(), reports()[0]])
+    assert _batch(monkeypatch, capsys, tmp_path)[0] == '1 converted, 1 unchanged, 0 failed'
+
+    # Options changed
+    assert _batch(monkeypatch, capsys, tmp_path, '-k')[0] == '2 converted, 0 unchanged, 0 failed'
+    assert _batch(monkeypatch, capsys, tmp_path, '-k')[0] == '0 converted, 2 unchanged, 0 failed'
+    assert _batch(monkeypatch, capsys, tmp_path, '-k', '-s')[0] == '2 converted, 0 unchanged, 0 failed'
+
+
+def test_batch_failed_redone(tmp_path, monkeypatch, capsys):
+    (a := tmp_path / 'a').mkdir()
+    (b := tmp_path / 'b').mkdir()
+    write_reports(a)
+    (b / 'zap.json').write_text('{"site": ')
+    assert _batch(monkeypatch, capsys, tmp_path) == ('1 converted, 0 unchanged, 1 failed', 1)
+    assert _batch(monkeypatch, capsys, tmp_path) == ('0 converted, 1 unchanged, 1 failed', 1)
+    (b / 'zap.json').write_text(json.dumps(reports()[0]))
+    assert _batch(monkeypatch, capsys, tmp_path) == ('1 converted, 1 unchanged, 0 failed', None)
@@ -0,0 +1,64 @@
+import json
+import os
+
+import pytest
+
+from zreprt import Filter, ZapReport
+from zreprt.zrcache import ParseCache
+
+from samples import reports, write_reports
+
+
+def _not_parsed(*args, **kwargs):
+    raise AssertionError('Parsed, not got from the cache')
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'lazy': True},
+    {'drop_fields': ['request_header', 'description']},
+    {'max_body_size': 2},
+    {'flt': Filter.parse(['risk>=medium'])},
+])
+def test_cached_same_as_uncached(tmp_path, monkeypatch, kwargs):
+    paths = write_reports(tmp_path)
+    cache = ParseCache(tmp_path / 'cache')
+    expected = [ZapReport.from_json_file(p, **kwargs) for p in paths]
+    assert [cache.load(p, **kwargs) for p in paths] == expected
+    with monkeypatch.context() as m:
+        m.setattr(ZapReport, 'from_json_file', _not_parsed)
+        assert [cache.load(p, **kwargs) for p in paths] == expected
+        with open(paths[0]) as f:
+            assert cache.load(f, **kwargs) == expected[0]
+            assert f.closed
+
+
+def test_options_and_content_keyed(tmp_path):
+    path, = write_reports(tmp_path, reports()[1:])
+    cache = ParseCache(tmp_path / 'cache')
+    for kwargs in ({}, {'drop_fields': ['response_body']}, {'max_body_size': 2}, {}):
+        assert cache.load(path, **kwargs) == ZapReport.from_json_file(path, **kwargs)
+    assert len(list((tmp_path / 'cache').glob('*.pickle'))) == 3
+
+    # Same name, other content
+    (tmp_path / 'zap-0.json').write_text(json.dumps(reports()[0]))
+    assert cache.load(path) == ZapReport.from_dict(reports()[0])
+
+
+def test_evicted_least_recently_used(tmp_path):
+    paths = write_reports(tmp_path)
+    cache = ParseCache(tmp_path / 'cache', max_size=1)
+    for p in paths:
+        cache.load(p)
+    assert len(list((tmp_path / 'cache').glob('*.pickle'))) == 0  # None fits
+
+    cache.max_size = 1 << 30
+    for p in paths:
+        cache.load(p)
+    for i, entry in enumerate(entries := list((tmp_path / 'cache').glob('*.pickle'))):
+        os.utime(entry, (i, i))  # Used long ago
+    cache.max_size = max(entry.stat().st_size for entry in entries)
+    cache.load(paths[0], drop_fields=['request_header'])  # Used last, evicting the others
+    assert len(list((tmp_path / 'cache').glob('*.pickle'))) == 1
+    assert cache.load(paths[0], drop_fields=['request_header']) == ZapReport.from_json_file(
+        paths[0], drop_fields=['request_header'])
@@ -0,0 +1,153 @@
+import hashlib
+import io
+import json
+
+import pytest
+
+from zreprt import ZapReport, ZapReportReader
+from zreprt.zreprt import _BODY_FIELDS, _LazyBody, _truncated, _untruncated
+from zreprt.zrjson import JsonScanner
+from zreprt.zrmerge import merge, preprocess
+
+from samples import alert, instance, report, reports, write_reports
+
+
+def _layouts():
+    """Report documents of the same content, laid out differently."""
+    d = reports()[1]
+    yield 'zap', d
+    yield 'zap-like', json.loads(ZapReport.from_dict(reports()[1]).json())
+    # Report headers after sites, site headers after alerts
+    yield 'late headers', {
+        'site': [{'alerts': s['alerts'], **{k: v for k, v in s.items() if k != 'alerts'}} for s in d['site']],
+        **{k: v for k, v in d.items() if k != 'site'},
+    }
+    yield 'no sites', {k: v for k, v in d.items() if k != 'site'}
+    yield 'empty', report([('https://example.com', [alert(1, 1, [])])])
+
+
+@pytest.mark.parametrize('name, d', list(_layouts()))
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_reader_same_as_from_dict(name, d, chunk_size):
+    expected = ZapReport.from_dict(d)
+    for doc in (json.dumps(d, indent=2), json.dumps(d, separators=(',', ':'))):
+        assert ZapReportReader(JsonScanner(io.BytesIO(doc.encode()), chunk_size=chunk_size)).read() == expected
+        assert ZapReportReader(JsonScanner(io.StringIO(doc), chunk_size=chunk_size)).read() == expected
+
+
+@pytest.mark.parametrize('name, d', list(_layouts()))
+def test_reader_lazy_same_as_from_dict(name, d):
+    # Scanned in place, request/response decoded on access
+    assert ZapReportReader(json.dumps(d).encode()).read() == ZapReport.from_dict(d)
+
+
+def test_from_json_file(tmp_path):
+    d = reports()[0]
+    (path := tmp_path / 'zap.json').write_text(json.dumps(d))
+    assert ZapReport.from_json_file(str(path)) == ZapReport.from_dict(json.loads(path.read_text()))
+    assert ZapReport.from_json_file(str(path), lazy=True) == ZapReport.from_dict(d)
+
+
+def test_lazy_same_as_eager(tmp_path):
+    paths = write_reports(tmp_path)
+    lazy = [ZapReport.from_json_file(p, lazy=True) for p in paths]
+    eager = [ZapReport.from_json_file(p) for p in paths]
+    lazy_ais = [ai for zr in lazy for site in zr.site for a in site.alerts for ai in a.instances]
+    eager_ais = [ai for zr in eager for site in zr.site for a in site.alerts for ai in a.instances]
+    assert any(isinstance(ai._raw('response_body'), _LazyBody) for ai in lazy_ais)
+    # Fingerprints (escaped bodies included) and request/response presence, not decoding
+    assert [(ai.fingerprint, ai.has_http_data) for ai in lazy_ais] == [
+        (ai.fingerprint, ai.has_http_data) for ai in eager_ais]
+    assert all(isinstance(ai._raw(f), _LazyBody) for ai in lazy_ais for f in _BODY_FIELDS if ai._raw(f))
+
+    expected, actual = io.StringIO(), io.StringIO()
+    merge([preprocess(zr) for zr in eager], trim=True).dump_json(expected)
+    merge([preprocess(zr) for zr in lazy], trim=True).dump_json(actual)
+    assert actual.getvalue() == expected.getvalue()
+    assert lazy == eager  # Decoded on access
+
+
+@pytest.mark.parametrize('drop_fields', [
+    ['request_header', 'request_body', 'response_header', 'response_body'],
+    ['description', 'evidence', 'otherinfo'],
+])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_reader_drop_fields(drop_fields, lazy):
+    d = reports()[1]
+    doc = json.dumps(d).encode()
+    zr = ZapReportReader(doc if lazy else io.BytesIO(doc), drop_fields=drop_fields).read()
+    assert zr == ZapReport.from_dict(d, drop_fields=drop_fields)
+    assert all(
+        getattr(ai, f, '') in ('', None) for a in zr.site[0].alerts for ai in a.instances for f in drop_fields
+    )
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_drop_bodies_same_as_no_bodies(tmp_path, lazy):
+    paths = write_reports(tmp_path, docs := reports())
+    for d in docs:  # Parsed as if there were no request/response data at all
+        for ai in (ai for s in d['site'] for a in s['alerts'] for ai in a['instances']):
+            for key in ('request-header', 'request-body', 'response-header', 'response-body'):
+                del ai[key]
+    expected, actual = io.StringIO(), io.StringIO()
+    merge([preprocess(ZapReport.from_dict(d)) for d in docs], trim=False).dump_json(expected)
+    zrs = [ZapReport.from_json_file(p, lazy=lazy, drop_fields=_BODY_FIELDS) for p in paths]
+    merge([preprocess(zr) for zr in zrs], trim=False).dump_json(actual)
+    assert actual.getvalue() == expected.getvalue()
+
+
+@pytest.mark.parametrize('drop_fields', [['bogus'], ['pluginid'], ['instances'], ['request_body', 'bogus']])
+def test_drop_fields_rejected(drop_fields):
+    doc = json.dumps(reports()[0]).encode()
+    with pytest.raises(ValueError, match='Unknown fields|cannot be dropped'):
+        ZapReportReader(io.BytesIO(doc), drop_fields=drop_fields).read()
+    with pytest.raises(ValueError, match='Unknown fields|cannot be dropped'):
+        ZapReport.from_dict(reports()[0], drop_fields=drop_fields)
+
+
+@pytest.mark.parametrize('extra', [b'{}', b'\n{"site": []}', b'x', b']'])
+def test_reader_rejects_extra_data(extra):
+    doc = json.dumps(reports()[0]).encode()
+    with pytest.raises(ValueError, match=f'Extra data at byte {len(doc) + 1}'):
+        ZapReportReader(io.BytesIO(doc + b' ' + extra.lstrip())).read()
+    with pytest.raises(ValueError, match='Extra data'):
+        ZapReportReader(doc + b' ' + extra.lstrip()).read()
+
+
+def test_reader_accepts_trailing_whitespace():
+    doc = json.dumps(reports()[0]).encode()
+    assert ZapReportReader(io.BytesIO(doc + b'\n\r\n  ')).read() == ZapReport.from_dict(reports()[0])
+
+
+def test_reader_rejects_truncated():
+    doc = json.dumps(report([('https://example.com', [alert(1, 1, [instance(0)])])])).encode()
+    for n in (len(doc) // 2, len(doc) - 1):
+        with pytest.raises(ValueError):
+            ZapReportReader(io.BytesIO(doc[:n])).read()
+
+
+def test_truncated_round_trip():
+    s = 'Ünïcode body\r\n' * 10
+    t = _truncated(s, 20)
+    assert t.startswith(s[:20]) and len(t) < len(s)
+    assert _untruncated(t) == (s[:20], {'length': len(s), 'sha256': hashlib.sha256(s.encode()).hexdigest()})
+    assert _truncated(t, 20) == t  # Not truncated again
+    assert _truncated(s, len(s)) == s
+    assert _untruncated(s) == (s, None)
+    bogus = s + '\n[zreprt: truncated, 1 chars, sha256:xyz]'
+    assert _untruncated(bogus) == (bogus, None)
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_reader_max_body_size(lazy):
+    hdr = f'GET /?id={"1" * 100} HTTP/1.1\r\nHost: example.com\r\n\r\n'
+    instances = [instance(0, 'x' * 100, request_header=hdr), instance(1, 'y')]
+    d = report([('https://example.com', [alert(1, 1, instances)])])
+    doc = json.dumps(d).encode()
+    zr = ZapReportReader(doc if lazy else io.BytesIO(doc), max_body_size=10).read()
+    assert zr == ZapReport.from_dict(d, max_body_size=10)
+    ai0, ai1 = zr.site[0].alerts[0].instances
+    assert ai0.request_header == hdr  # Headers are kept whole
+    assert _untruncated(ai0.response_body) == (
+        'x' * 10, {'length': 100, 'sha256': hashlib.sha256(b'x' * 100).hexdigest()})
+    assert ai1.response_body == 'y'
@@ -0,0 +1,83 @@
+import io
+import json
+
+import pytest
+
+from zreprt import Filter, ZapReport, ZapReportReader
+from zreprt.zrmerge import preprocess
+
+from samples import reports
+
+
+def test_parse_repeated_keys():
+    flt = Filter.parse([
+        'plugin=1|2', 'plugin=3', 'plugin!=2', 'plugin!=4|5',
+        'risk>=low', 'risk>=2', 'risk>=1', 'confidence>=high', 'confidence>=1',
+        'uri^=https://a/', 'uri^=https://b/', 'uri~=x$', 'uri~=^y', 'host=a|b', 'host=c',
+    ])
+    assert flt.plugins == {1, 2, 3}
+    assert flt.exclude_plugins == {2, 4, 5}
+    assert flt.min_risk == 2
+    assert flt.min_confidence == 3
+    assert flt.uri_prefixes == ('https://a/', 'https://b/')
+    assert flt.hosts == {'a', 'b', 'c'}
+    # Repeated terms of the same key are alternatives
+    assert flt.instance_ok('https://a/x') and flt.instance_ok('https://b/yx')
+    assert not flt.instance_ok('https://a/xy') and not flt.instance_ok('https://c/x')
+
+
+def test_parse_canonical_terms():
+    flt = Filter.parse(['uri~=x', 'plugin=3|1', 'uri~=y', 'risk>=medium', 'host=b|a', 'plugin!=2'])
+    assert flt.terms() == ['plugin=1|3', 'plugin!=2', 'risk>=2', 'uri~=(?:x)|(?:y)', 'host=a|b']
+    assert Filter.parse(flt.terms()) == flt
+    assert Filter.parse('plugin=1') == Filter(plugins=[1])
+
+
+@pytest.mark.parametrize('term', ['plugin', 'plugin>=1', 'risk>=extreme', 'risk=1', 'bogus=1', 'uri~=(', 'plugin=x'])
+def test_parse_malformed(term):
+    with pytest.raises(ValueError, match='filter term'):
+        Filter.parse(term)
+
+
+def test_alert_ok():
+    flt = Filter.parse(['plugin!=2', 'risk>=medium', 'confidence>=2'])
+    assert flt.alert_ok(1, 2, 2) and flt.alert_ok(1, 3, 4)
+    assert not flt.alert_ok(2, 3, 3)
+    assert not flt.alert_ok(1, 1, 3)  # Risk below
+    assert not flt.alert_ok(1, 3, 1)  # Confidence below
+    assert flt.alert_ok(1) and flt.alert_ok(riskcode=2)  # Values not read yet are not checked
+    assert Filter.parse(['plugin=1', 'plugin!=1']).alert_ok(1) is False
+    assert Filter().alert_ok(1, 0, 0)
+
+
+def test_excluding_and_site_ok():
+    flt = Filter.parse(['plugin!=1', 'host=example.com'])
+    assert flt.excluding(['2', 3]).exclude_plugins == {1, 2, 3}
+    assert flt.excluding([]) == flt
+    assert flt.site_ok('example.com') and not flt.site_ok('old.example.com')
+    assert Filter().site_ok('any')
+
+
+@pytest.mark.parametrize('terms', [
+    [],
+    ['plugin=1'],
+    ['plugin!=1'],
+    ['plugin=1|2', 'plugin!=2'],
+    ['risk>=medium'],
+    ['risk>=high', 'confidence>=3'],
+    ['uri^=https://example.com/1'],
+    ['uri~=/[0-4]$', 'uri~=/3[0-9]$'],
+    ['host=old.example.com'],
+    ['host=nowhere'],
+    ['uri~=nowhere'],
+])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_filtered_parse_same_as_parse_then_filter(terms, lazy):
+    flt = Filter.parse(terms)
+    for d in reports():
+        doc = json.dumps(d).encode()
+        zr = ZapReportReader(doc if lazy else io.BytesIO(doc), flt=flt).read()
+        expected = preprocess(ZapReport.from_dict(d), exclude_alerts=[], flt=flt)
+        assert preprocess(zr, exclude_alerts=[], flt=flt) == expected
+        # Nothing rejected is left after parsing
+        assert preprocess(zr, exclude_alerts=[]) == expected
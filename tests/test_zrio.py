@@ -0,0 +1,51 @@
+import bz2
+import gzip
+import io
+import lzma
+
+import pytest
+
+from zreprt import ZapReport
+from zreprt.zrio import compression, open_input, open_output
+
+from samples import reports
+
+
+_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open, '.lzma': lzma.open}
+
+
+def _dumped(zr):
+    fo = io.StringIO()
+    zr.dump_json(fo)
+    return fo.getvalue()
+
+
+@pytest.mark.parametrize('ext', ['.gz', '.bz2', '.xz', '.lzma', ''])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_round_trip(tmp_path, ext, lazy):
+    zr = ZapReport.from_dict(reports()[1])  # Non-ASCII
+    path = tmp_path / f'zap.json{ext}'
+    with open_output(str(path)) as fo:
+        zr.dump_json(fo)
+    with (_OPENERS.get(ext, open))(path, 'rt', encoding='utf-8') as fo:
+        assert fo.read() == _dumped(zr)  # Compressed as the extension says
+
+    assert ZapReport.from_json_file(str(path), lazy=lazy) == zr
+    with open(path) as f:  # Text file object, as of argparse (or STDIN)
+        assert ZapReport.from_json_file(f, lazy=lazy) == zr
+        assert f.closed
+    # Detected by magic bytes, not by the name
+    path.rename(renamed := tmp_path / 'zap-renamed.json')
+    assert ZapReport.from_json_file(str(renamed), lazy=lazy) == zr
+
+
+def test_compression_detected():
+    data = b'{"site": []}'
+    for name, compress in (('gzip', gzip.compress), ('bz2', bz2.compress), ('lzma', lzma.compress)):
+        assert compression(io.BytesIO(compress(data))) == name
+        with open_input(io.BytesIO(compress(data))) as fo:
+            assert fo.read() == data
+    assert compression(io.BytesIO(data)) is None
+    assert compression(io.StringIO(data.decode())) is None
+    with open_input(fo := io.BytesIO(data)) as dfo:
+        assert dfo is fo  # Uncompressed one as is
@@ -0,0 +1,97 @@
+import io
+import json
+import tracemalloc
+
+import pytest
+
+from zreprt import ZapReport, ZapReportReader, zrjson
+from zreprt.zrjson import JsonScanner
+from zreprt.zrmerge import merge, preprocess
+from zreprt.zrstore import FindingsStore
+
+from samples import reports
+
+
+def _escape_heavy_doc(size):
+    """Array of an alert with a body of about `size` chars, every one of them escaped, then a small alert."""
+    body = '"\\\n' * (size // 3)
+    return json.dumps([{'instances': [{'uri': 'u', 'response-body': body}]}, {'pluginid': 1}]).encode()
+
+
+def test_span_escape_heavy_string():
+    doc = _escape_heavy_doc(256 << 10)
+    sc = JsonScanner(io.BytesIO(doc), chunk_size=1 << 12)
+    elements = sc.elements()
+    next(elements)
+    tracemalloc.start()
+    try:
+        start, end = sc.span()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert json.loads(sc.buf[start:end])['instances'][0]['uri'] == 'u'
+    next(elements)
+    assert sc.value() == {'pluginid': 1}
+    # Buffered data (grown by doubling) only, no per-escape state
+    assert peak < 4 * len(doc)
+
+
+def test_value_escape_heavy_string():
+    doc = _escape_heavy_doc(1 << 20)
+    for src in (doc, io.BytesIO(doc)):
+        assert JsonScanner(src, chunk_size=1 << 12).value() == json.loads(doc)
+
+
+_DOC = {
+    'ascii': 'plain', 'Ünïcode ключ': 'значение \u2028 \U0001f600', 'escapes': '"\\\n\t\x00\x7f',
+    'numbers': [0, -1, 1.5, 1e100, 2 ** 70], 'consts': [True, False, None],
+    'empty': [[], {}, '', [[]], {'': {}}], 'nested': {'a': [{'b': [1, {'c': []}]}]},
+}
+
+
+def _iterators(obj):
+    """`obj` with dicts turned into callables, in turns, and arrays into iterators (of plain data)."""
+    if isinstance(obj, dict):
+        d = {k: _iterators(v) for k, v in obj.items()}
+        return (lambda: d) if len(d) % 2 else d
+    if isinstance(obj, list):
+        return iter(obj)
+    return obj
+
+
+@pytest.mark.parametrize('indent', [4, 2])
+def test_dump_same_as_json_dump(indent):
+    for doc, obj in [
+        (_DOC, _DOC),
+        (_DOC, _iterators(_DOC)),
+        ({'nested': _DOC, 'plain': _DOC, 'none': []}, {'nested': _iterators(_DOC), 'plain': _DOC, 'none': iter([])}),
+    ]:
+        expected, fo = io.StringIO(), io.StringIO()
+        json.dump(doc, expected, indent=indent, ensure_ascii=False)
+        zrjson.dump(obj, fo, indent=indent)
+        assert fo.getvalue() == expected.getvalue()
+
+
+def _json_dumped(zr, orig=False):
+    fo = io.StringIO()
+    json.dump(json.loads(zr.json_orig() if orig else zr.json()), fo, indent=4, ensure_ascii=False)
+    return fo.getvalue()
+
+
+@pytest.mark.parametrize('orig', [False, True])
+def test_dump_json_same_as_json_dump(tmp_path, orig):
+    d0, d1 = reports()  # Non-ASCII bodies, alerts of no instances
+    zrs = [
+        ZapReport.from_dict(d0),
+        ZapReportReader(json.dumps(d1).encode()).read(),  # Instances decoded on access
+        ZapReport(),
+    ]
+    with FindingsStore(str(tmp_path / 'findings.db')) as store:
+        for d in (d0, d1):
+            store.add(preprocess(ZapReport.from_dict(d)))
+        zrs.append(store.report())  # Alerts iterated from the store
+        zrs.append(merge([preprocess(ZapReport.from_dict(d)) for d in (d0, d1)]))
+        for zr in zrs:
+            fo = io.StringIO()
+            (zr.dump_json_orig if orig else zr.dump_json)(fo)
+            assert fo.getvalue() == _json_dumped(zr, orig)
@@ -0,0 +1,31 @@
+import io
+
+import pytest
+
+from zreprt.zrmerge import ingest, merge, merge_external
+
+from samples import reports, write_reports
+
+
+@pytest.mark.parametrize('trim', [False, True])
+def test_merge_external_same_as_merge(tmp_path, trim):
+    paths = write_reports(tmp_path)
+    expected, actual = io.StringIO(), io.StringIO()
+    merge(ingest(paths), trim=trim).dump_json(expected)
+    # Spilling runs on every instance
+    merge_external(paths, trim=trim, mem_budget=1).dump_json(actual)
+    assert actual.getvalue() == expected.getvalue()
+
+
+@pytest.mark.parametrize('opened', [False, True])
+def test_ingest_parallel_same_as_serial(tmp_path, opened):
+    paths = write_reports(tmp_path, [*reports(), reports()[0]])
+    in_files = [open(p) for p in paths] if opened else paths
+    zrs = ingest(in_files, jobs=2)
+    assert zrs == ingest(paths, jobs=1)  # In the order given
+    if opened:
+        assert all(f.closed for f in in_files)  # Handed to workers by name
+    expected, actual = io.StringIO(), io.StringIO()
+    merge(ingest(paths), trim=True).dump_json(expected)
+    merge(zrs, trim=True).dump_json(actual)
+    assert actual.getvalue() == expected.getvalue()
@@ -0,0 +1,51 @@
+import io
+import json
+
+from zreprt import ZapReport
+from zreprt.zr2sarif import transmodel_dump
+from zreprt.zrsarif import merge_sarif
+
+
+def _report():
+    instances = [
+        {
+            'uri': f'https://example.com/{n % 4}', 'method': 'POST', 'param': '', 'attack': '', 'evidence': '',
+            'otherinfo': '', 'request-header': f'POST /{n % 4} HTTP/1.1\r\nHost: example.com\r\n\r\n',
+            'request-body': f'id={n}', 'response-header': 'HTTP/1.1 200 OK\r\n\r\n', 'response-body': '',
+        }
+        for n in range(12)
+    ]
+    return ZapReport.from_dict({
+        '@programName': 'ZAP', '@version': '2.14.0', '@generated': 'Mon, 1 Jan 2024 00:00:00',
+        'site': [{
+            '@name': 'https://example.com', '@host': 'example.com', '@port': '443', '@ssl': 'true',
+            'alerts': [{
+                'pluginid': '40018', 'alertRef': '40018', 'alert': 'SQL Injection', 'name': 'SQL Injection',
+                'riskcode': '3', 'confidence': '2', 'riskdesc': '', 'desc': '', 'instances': instances,
+                'count': str(len(instances)), 'solution': '', 'otherinfo': '', 'reference': '',
+                'cweid': '89', 'wascid': '19', 'sourceid': '1',
+            }],
+        }],
+    })
+
+
+def _sarif(tables):
+    fo = io.StringIO()
+    transmodel_dump(_report(), fo, tables=tables)
+    return fo.getvalue().encode()
+
+
+def _merged_results(*logs):
+    fo = io.StringIO()
+    merge_sarif([io.BytesIO(log) for log in logs], fo)
+    return json.loads(fo.getvalue())['runs'][0]['results']
+
+
+def test_merge_tables_log_with_itself():
+    log = _sarif(tables=True)
+    assert len(_merged_results(log, log)) == len(_merged_results(log)) == 12
+
+
+def test_merge_tables_log_with_inline_twin():
+    assert len(_merged_results(_sarif(tables=True), _sarif(tables=False))) == 12
+    assert len(_merged_results(_sarif(tables=False), _sarif(tables=True))) == 12
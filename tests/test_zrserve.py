@@ -0,0 +1,55 @@
+import asyncio
+import io
+import json
+
+from zreprt import ZapReport
+from zreprt.zrmerge import merge, preprocess
+from zreprt.zrserve import ConversionService
+
+from samples import reports
+
+
+async def _request(port, target, body=b''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'POST {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), body
+
+
+def _serve_requests(*requests):
+    """Statuses and bodies of `requests` served on an ephemeral port."""
+    async def run():
+        service = ConversionService(jobs=1)
+        try:
+            server = await asyncio.start_server(service.handle, host='127.0.0.1', port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return [await _request(port, *r) for r in requests]
+        finally:
+            service.close()
+    return asyncio.run(run())
+
+
+def test_convert():
+    expected = io.StringIO()
+    merge([preprocess(ZapReport.from_dict(d)) for d in reports()], trim=True).dump_json(expected)
+    (status, body), (status_sarif, body_sarif) = _serve_requests(
+        ('/convert', json.dumps(reports()).encode()),
+        ('/convert?format=sarif', json.dumps(reports()[0]).encode()),
+    )
+    assert status == 200 and body.decode() == expected.getvalue()
+    assert status_sarif == 200 and json.loads(body_sarif)['runs'][0]['results']
+
+
+def test_bad_requests():
+    responses = _serve_requests(
+        ('/convert?format=xml', b'{}'),
+        ('/convert?exclude=x', b'{}'),
+        ('/convert', b'{"site": '),
+        ('/convert', b'[]'),
+    )
+    assert [status for status, _ in responses] == [400] * 4
+    assert b'Unknown format' in responses[0][1]
@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+from zreprt.zrmerge import ingest, merge
+from zreprt.zrsqlite import export_sqlite
+
+from samples import write_reports
+
+
+_HTTP_FIELDS = ('request_header', 'request_body', 'response_header', 'response_body')
+
+
+@pytest.mark.parametrize('trim', [False, True])
+def test_export_same_as_merged(tmp_path, trim):
+    zr = merge(ingest(write_reports(tmp_path)), trim=trim)
+    db = tmp_path / 'findings.db'
+    db.write_text('Replaced')
+    export_sqlite(zr, db)
+
+    alerts = zr.site[0].alerts
+    instances = [ai for a in alerts for ai in a.instances]
+    conn = sqlite3.connect(db)
+    try:
+        def count(table):
+            return conn.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+
+        assert [count(t) for t in ('sites', 'alerts', 'instances', 'findings')] == [
+            1, len(alerts), len(instances), len(instances)]
+        assert conn.execute('SELECT pluginid, count FROM alerts ORDER BY id').fetchall() == [
+            (a.pluginid, len(a.instances)) for a in alerts]
+        assert conn.execute(
+            'SELECT alert_id, count(*) FROM instances GROUP BY alert_id ORDER BY alert_id').fetchall() == [
+            (i, len(a.instances)) for i, a in enumerate(alerts, 1) if a.instances]
+        # Request/response data stored once, restored as it was
+        contents = {getattr(ai, f) for ai in instances for f in _HTTP_FIELDS} - {None, ''}
+        assert count('bodies') == len(contents)
+        assert conn.execute(
+            f'SELECT pluginid, uri, param, {", ".join(_HTTP_FIELDS)} FROM findings ORDER BY id').fetchall() == [
+            (a.pluginid, ai.uri, ai.param, *(getattr(ai, f) or None for f in _HTTP_FIELDS))
+            for a in alerts for ai in a.instances
+        ]
+        assert {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")} >= {
+            'alerts_riskcode', 'alerts_pluginid', 'instances_uri', 'instances_param'}
+    finally:
+        conn.close()
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == '.tmp'] == []
@@ -0,0 +1,60 @@
+import io
+import os
+
+import pytest
+
+from zreprt.zrmerge import ingest, merge
+from zreprt.zrstore import FindingsStore, source_key
+
+from samples import reports, write_reports
+
+
+def _dumped(zr):
+    fo = io.StringIO()
+    zr.dump_json(fo)
+    return fo.getvalue()
+
+
+@pytest.mark.parametrize('trim', [False, True])
+def test_incremental_same_as_merge(tmp_path, trim):
+    paths = write_reports(tmp_path)
+    db = str(tmp_path / 'findings.db')
+    for path in paths:  # Store reopened for every report
+        with FindingsStore(db) as store:
+            assert store.add(*ingest([path]), source_key(path))
+    with FindingsStore(db) as store:
+        assert _dumped(store.report(trim=trim)) == _dumped(merge(ingest(paths), trim=trim))
+
+
+def test_same_source_skipped(tmp_path):
+    path, = write_reports(tmp_path, reports()[:1])
+    db = str(tmp_path / 'findings.db')
+    with FindingsStore(db) as store:
+        assert store.add(*ingest([path]), source_key(path))
+        assert not store.add(*ingest([path]), source_key(path))
+        assert store.has(source_key(path))
+        expected = _dumped(merge(ingest([path]), trim=True))
+        assert _dumped(store.report(trim=True)) == expected
+        assert '(combo)' not in expected
+    # The same file changed is another source
+    os.utime(path, ns=(0, 0))
+    with FindingsStore(db) as store:
+        assert not store.has(source_key(path))
+
+
+def test_other_options_refused(tmp_path):
+    path, = write_reports(tmp_path, reports()[:1])
+    db = str(tmp_path / 'findings.db')
+    with FindingsStore(db, {'max_body_size': None}) as store:
+        store.add(*ingest([path]))
+    with FindingsStore(db, {'max_body_size': None}):
+        pass
+    with pytest.raises(ValueError, match='other options'):
+        FindingsStore(db, {'max_body_size': 10})
+
+
+def test_closed(tmp_path):
+    with FindingsStore(str(tmp_path / 'findings.db')) as store:
+        pass
+    with pytest.raises(Exception, match='closed'):
+        store.report()